@@ -19,17 +19,19 @@
 
 import QtQuick 2.4
 import Ubuntu.Components 1.3
-import QtGraphicalEffects 1.0
 
-// Blurred background
+// Blurred background, the blur of each art is rendered once by the blurCache
 Item {
+    id: blurredBackground
     width: parent.width
 
     property string art
     // need to expose color so sidebar can set its own
     property string color: "black"
+    // art that is likely to be shown next so its blur is rendered in advance
+    property string prefetchArt: ""
 
-    // dark layer
+    // dark layer shown until the first blur is ready
     Rectangle {
         anchors {
             fill: parent
@@ -37,43 +39,44 @@ Item {
         color: parent.color
     }
 
-    // the album art
+    // the blurred album art, the previous blur stays while the next is
+    // rendered and is cleared when there is no art or it can't be rendered
     Image {
-        id: backgroundImage
-        anchors.horizontalCenter: parent.horizontalCenter
-        anchors.verticalCenter: parent.verticalCenter
+        id: blurImage
+        anchors.fill: parent
         asynchronous: true
-        fillMode: Image.PreserveAspectCrop
-        height: parent.height
-        source: art // this has to be fixed for the default cover art to work - cant find in this dir
-
-        // TODO: This should be investigated once http://pad.lv/1391368
-        //       is resolved. Once it is, these can either be set to
-        //       "height" and "width" or a property exposed via the
-        //       SDK or Thumbnailer to avoid a regression caused by
-        //       these hardcoded values changing in the Thumbnailer.
-        //       512 is size of the "xlarge" thumbnails in pixels.
-        sourceSize.height: 512
-        sourceSize.width: 512
-
-        visible: false
-        width: Math.max(parent.height, parent.width)
     }
 
-    // the blur
-    FastBlur {
-        id: backgroundBlur
-        anchors.fill: backgroundImage
-        source: backgroundImage
-        radius: units.dp(42)
-        opacity: 0.2
+    Connections {
+        target: blurCache
+        onReady: {
+            if (key === blurCache.keyFor(art, width, height, color)) {
+                blurImage.source = source
+            }
+        }
     }
-    onArtChanged: {
-        // TODO: This is a work around for LP:1261078 and LP:1306845. Ideally,
-        //       there should be a better way of getting the blur to repaint
-        backgroundImage.source = art
-        backgroundBlur.source = null
-        backgroundBlur.source = backgroundImage
+
+    Timer {  // wait for the size and art to settle before requesting a blur
+        id: updateTimer
+        interval: 0
+        onTriggered: {
+            var source = blurCache.request(art, width, height, color)
+
+            if (source !== "") {
+                blurImage.source = source
+            } else if (!blurCache.isPending(blurCache.keyFor(art, width, height, color))) {
+                blurImage.source = ""
+            }
+
+            if (prefetchArt !== "" && prefetchArt !== art) {
+                blurCache.prefetch(prefetchArt, width, height, color)
+            }
+        }
     }
-}
 
+    onArtChanged: updateTimer.restart()
+    onColorChanged: updateTimer.restart()
+    onHeightChanged: updateTimer.restart()
+    onPrefetchArtChanged: updateTimer.restart()
+    onWidthChanged: updateTimer.restart()
+}
@@ -34,13 +34,16 @@ Dialog {
         onClicked: {
             PopupUtils.close(dialogContentHubNotFound)
 
-            contentHubWaitForFile.dialog = PopupUtils.open(Qt.resolvedUrl("ContentHubWaitDialog.qml"), mainView)
-            contentHubWaitForFile.start();
+            contentHubWaitForFile.wait();
         }
     }
 
     Button {
         text: i18n.tr("Cancel")
-        onClicked: PopupUtils.close(dialogContentHubNotFound)
+        onClicked: {
+            PopupUtils.close(dialogContentHubNotFound)
+
+            contentHubWaitForFile.cancel();
+        }
     }
 }
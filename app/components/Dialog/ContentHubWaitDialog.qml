@@ -25,13 +25,35 @@ import "../"
 Dialog {
     id: dialogContentHubWait
 
+    property int found: 0  // imported files found by ms2
+    property int imported: 0  // files moved successfully
+    property int moved: 0
+    property int total: 0  // files to move
+
     LoadingSpinnerComponent {
         anchors {
             horizontalCenter: parent.horizontalCenter
             top: undefined
             margins: units.gu(0)
         }
-        loadingText: i18n.tr("Waiting for file(s)...")
+        loadingText: {
+            if (total === 0) {
+                i18n.tr("Waiting for file(s)...")
+            } else if (moved < total) {
+                // TRANSLATORS: %1 is the number of files moved so far and %2 the number of files being imported
+                i18n.tr("Importing %1 of %2 file(s)...").arg(moved).arg(total)
+            } else {
+                // TRANSLATORS: %1 is the number of files found in the library so far and %2 the number of files imported
+                i18n.tr("Waiting for %1 of %2 file(s)...").arg(imported - found).arg(imported)
+            }
+        }
         visible: true
     }
+
+    ProgressBar {
+        maximumValue: Math.max(total * 2, 1)
+        minimumValue: 0
+        value: moved + found
+        visible: total > 0
+    }
 }
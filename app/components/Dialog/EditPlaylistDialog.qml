@@ -23,6 +23,7 @@ import Ubuntu.Components.Popups 1.3
 import QtQuick.LocalStorage 2.0
 import "../../logic/meta-database.js" as Library
 import "../../logic/playlists.js" as Playlists
+import "../../logic/storage.js" as Storage
 
 Dialog {
     id: dialogEditPlaylist
@@ -51,7 +52,11 @@ Dialog {
             if (playlistName.text.length > 0) { // make sure something is acually inputed
                 console.debug("Debug: User changed name from "+oldPlaylistName+" to "+playlistName.text)
 
-                if (Playlists.renamePlaylist(oldPlaylistName, playlistName.text) === true) {
+                // rename the playlist and recent in one commit
+                var renamed = Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                    if (Playlists.renamePlaylist(oldPlaylistName, playlistName.text) !== true) {
+                        return false
+                    }
 
                     if (Library.recentContainsPlaylist(oldPlaylistName)) {
                         Library.recentRenamePlaylist(oldPlaylistName, playlistName.text)
@@ -61,6 +66,10 @@ Dialog {
 
                     playlistChangedHelper()  // update recent/playlist models
 
+                    return true
+                })
+
+                if (renamed) {
                     PopupUtils.close(dialogEditPlaylist)
                 }
                 else {
@@ -23,6 +23,7 @@ import Ubuntu.Components.Popups 1.3
 import QtQuick.LocalStorage 2.0
 import "../../logic/meta-database.js" as Library
 import "../../logic/playlists.js" as Playlists
+import "../../logic/storage.js" as Storage
 
 Dialog {
     id: dialogRemovePlaylist
@@ -38,14 +39,16 @@ Dialog {
         color: styleMusic.dialog.confirmRemoveButtonColor
         objectName: "removePlaylistDialogRemoveButton"
         onClicked: {
-            // removing playlist
-            Playlists.removePlaylist(dialogRemovePlaylist.oldPlaylistName)
+            // removing playlist, committed once with the recent changes
+            Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                Playlists.removePlaylist(dialogRemovePlaylist.oldPlaylistName)
 
-            if (Library.recentContainsPlaylist(dialogRemovePlaylist.oldPlaylistName)) {
-                Library.recentRemovePlaylist(dialogRemovePlaylist.oldPlaylistName)
-            }
+                if (Library.recentContainsPlaylist(dialogRemovePlaylist.oldPlaylistName)) {
+                    Library.recentRemovePlaylist(dialogRemovePlaylist.oldPlaylistName)
+                }
 
-            playlistChangedHelper(true)  // update recent/playlist models
+                playlistChangedHelper(true)  // update recent/playlist models
+            })
 
             songStackPage.page = undefined
             PopupUtils.close(dialogRemovePlaylist)
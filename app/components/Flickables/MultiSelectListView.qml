@@ -26,7 +26,7 @@ MusicListView {
     state: ViewItems.selectMode ? "multiselectable" : "normal"
 
     // Describes if model.move() should be called when a list item drag is completed
-    // this is not required on the Queue as onReorder performs playlist.moveItem()
+    // this is not required on the Queue as onReorder performs playlist.moveItemWrapper()
     property bool autoModelMove: true
 
     signal clearSelection()
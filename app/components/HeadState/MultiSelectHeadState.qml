@@ -83,7 +83,7 @@ State {
                             items.push(Qt.resolvedUrl(listview.model.get(indicies[i], listview.model.RoleModelData).filename));
                         }
 
-                        player.mediaPlayer.playlist.addItems(items);
+                        player.mediaPlayer.playlist.addItemsWrapper(items);
 
                         listview.closeSelection()
                     }
@@ -0,0 +1,309 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import Ubuntu.Components 1.3
+import QtGraphicalEffects 1.0
+import "../../logic/tracing.js" as Tracing
+
+
+// Renders the blurred background of an album art once for each size and
+// colour and caches it, in memory and as a PNG in cacheDir if it is set, so
+// that changing track swaps an image rather than running the blur again.
+// Requests are rendered one at a time, prefetches after any requests.
+// The disk cache has a fixed number of slots, each blur is saved in the slot
+// of its hash along with its key, and replaces the blur that was there.
+Item {
+    id: blurCache
+    // keep the renderer out of the window, it is only drawn when grabbed
+    x: -renderer.width
+    y: -renderer.height
+
+    property string cacheDir: ""  // directory the rendered blurs are saved in
+    property int maxDiskEntries: 100  // slots of the disk cache
+    property int maxMemoryEntries: 20
+    property var current: null  // job being probed or rendered
+    property var jobs: []  // pending {key, art, width, height, color}
+    property var memory: ({})  // key -> url of a rendered or saved blur
+    property var memoryOrder: []  // keys in memory from oldest to newest
+    property var results: ({})  // key -> grab result which must be kept alive
+
+    // the source is empty if the blur could not be rendered
+    signal ready(string key, url source)
+
+    function keyFor(art, width, height, color) {
+        return art + "|" + Math.round(width) + "x" + Math.round(height) + "|" + color;
+    }
+
+    // Path of the slot of the key in the disk cache, without an extension
+    function slotFor(key) {
+        var hash = 5381;
+
+        for (var i=0; i < key.length; i++) {
+            hash = ((hash * 33) ^ key.charCodeAt(i)) >>> 0;
+        }
+
+        return cacheDir + "/blur-" + (hash % maxDiskEntries);
+    }
+
+    function fileFor(key) {
+        return slotFor(key) + ".png";
+    }
+
+    // Url of the saved blur, unique to the key so that images cached by url
+    // are not shared by the keys of a slot
+    function sourceFor(key) {
+        return "file://" + fileFor(key) + "?key=" + encodeURIComponent(key);
+    }
+
+    // Get the key of the blur saved in the slot of key, "" if there is none
+    function savedKey(key) {
+        var request = new XMLHttpRequest();
+
+        request.open("GET", "file://" + slotFor(key) + ".key", false);
+
+        try {
+            request.send();
+        } catch (err) {
+            return "";
+        }
+
+        return request.responseText;
+    }
+
+    function writeKey(key, text) {
+        var request = new XMLHttpRequest();
+
+        request.open("PUT", "file://" + slotFor(key) + ".key", false);
+
+        try {
+            request.send(text);
+        } catch (err) {
+            console.debug("Unable to write blur key " + key + ": " + err);
+            return false;
+        }
+
+        return true;
+    }
+
+    // Save the blur in the slot of the key, the slot is marked empty while
+    // the image is replaced so a partial save is never read as another key
+    function save(key, result) {
+        var replaced = savedKey(key);
+
+        if (replaced !== "" && replaced !== key) {
+            forget(replaced);
+        }
+
+        return writeKey(key, "") && result.saveToFile(fileFor(key)) && writeKey(key, key);
+    }
+
+    // Whether the blur is being rendered or waiting to be
+    function isPending(key) {
+        if (current !== null && current.key === key) {
+            return true;
+        }
+
+        for (var i=0; i < jobs.length; i++) {
+            if (jobs[i].key === key) {
+                return true;
+            }
+        }
+
+        return false;
+    }
+
+    // Get the blur now if it is in memory otherwise queue it and return ""
+    function request(art, width, height, color) {
+        return add(art, width, height, color, true);
+    }
+
+    // Queue the blur to be ready for a later request
+    function prefetch(art, width, height, color) {
+        add(art, width, height, color, false);
+    }
+
+    function add(art, width, height, color, first) {
+        var key = keyFor(art, width, height, color);
+
+        if (memory[key] !== undefined) {
+            return memory[key];
+        } else if (art === "" || width < 1 || height < 1) {
+            return "";
+        }
+
+        if (isPending(key)) {
+            return "";
+        }
+
+        var job = {key: key, art: art, width: Math.round(width), height: Math.round(height), color: color};
+
+        if (first) {
+            jobs.unshift(job);
+        } else {
+            jobs.push(job);
+        }
+
+        if (current === null) {
+            next();
+        }
+
+        return "";
+    }
+
+    function remember(key, source, result) {
+        memory[key] = source;
+        memoryOrder.push(key);
+
+        if (result !== null) {
+            results[key] = result;
+        }
+
+        while (memoryOrder.length > maxMemoryEntries) {
+            var oldest = memoryOrder.shift();
+
+            delete memory[oldest];
+            delete results[oldest];
+        }
+
+        ready(key, source);
+    }
+
+    function forget(key) {
+        var index = memoryOrder.indexOf(key);
+
+        if (index !== -1) {
+            memoryOrder.splice(index, 1);
+        }
+
+        delete memory[key];
+        delete results[key];
+    }
+
+    function next() {
+        current = jobs.shift() || null;
+
+        if (current === null) {
+            return;
+        }
+
+        if (memory[current.key] !== undefined) {
+            next();
+        } else if (cacheDir !== "" && savedKey(current.key) === current.key) {
+            probe.source = sourceFor(current.key);  // load it from the disk cache
+        } else {
+            render();
+        }
+    }
+
+    function render() {
+        current.span = Tracing.begin("renderBlur");
+
+        renderer.width = current.width;
+        renderer.height = current.height;
+        renderer.color = current.color;
+        rendererImage.source = current.art;
+
+        if (rendererImage.status !== Image.Loading) {
+            grabTimer.start();
+        }
+    }
+
+    function grab() {
+        var job = current;
+
+        var grabbed = renderer.grabToImage(function(result) {
+            var source = result.url;
+
+            if (cacheDir !== "" && save(job.key, result)) {
+                source = sourceFor(job.key);
+                result = null;
+            }
+
+            Tracing.end(job.span);
+
+            remember(job.key, source, result);
+            next();
+        }, Qt.size(job.width, job.height));
+
+        if (!grabbed) {  // skip the job if it can't be rendered
+            Tracing.end(job.span);
+            ready(job.key, "");
+            next();
+        }
+    }
+
+    // Load a previously saved blur
+    Image {
+        id: probe
+        asynchronous: true
+        cache: false
+        visible: false
+
+        onStatusChanged: {
+            if (blurCache.current === null || source == "") {
+                return;
+            } else if (status === Image.Ready) {
+                var key = blurCache.current.key;
+
+                source = "";
+                blurCache.remember(key, blurCache.sourceFor(key), null);
+                blurCache.next();
+            } else if (status === Image.Error) {
+                source = "";
+                blurCache.render();
+            }
+        }
+    }
+
+    Timer {  // give the blur a frame to update before grabbing it
+        id: grabTimer
+        interval: 16
+        onTriggered: blurCache.grab()
+    }
+
+    // Same composition as the live blur, a dark layer with the blurred art
+    Rectangle {
+        id: renderer
+        clip: true
+
+        Image {
+            id: rendererImage
+            anchors.centerIn: parent
+            asynchronous: true
+            fillMode: Image.PreserveAspectCrop
+            height: parent.height
+            // 512 is size of the "xlarge" thumbnails in pixels
+            sourceSize.height: 512
+            sourceSize.width: 512
+            visible: false
+            width: Math.max(parent.height, parent.width)
+
+            onStatusChanged: {
+                if (blurCache.current !== null && status !== Image.Loading && source == blurCache.current.art) {
+                    grabTimer.start();
+                }
+            }
+        }
+
+        FastBlur {
+            anchors.fill: rendererImage
+            source: rendererImage
+            radius: units.dp(42)
+            opacity: 0.2
+        }
+    }
+}
@@ -21,6 +21,7 @@ import QtQuick 2.4
 import Ubuntu.Components 1.3
 import Ubuntu.Components.Popups 1.3
 import Ubuntu.Content 1.3
+import "../../logic/playlist-formats.js" as PlaylistFormats
 import "../../logic/stored-request.js" as StoredRequest
 
 
@@ -49,8 +50,6 @@ Item {
         id: contentHub
         target: ContentHub
 
-        property var searchPaths: []
-
         onExportRequested: {
             activeExportTransfer = transfer;
 
@@ -118,7 +117,7 @@ Item {
                     return i18n.tr("Failed to move file")
                 }
                 else {
-                    contentHub.searchPaths.push(dir + "/" + filename)
+                    contentHubWaitForFile.addPath(dir + "/" + filename)
                     return true
                 }
             }
@@ -129,114 +128,209 @@ Item {
 
             console.debug("Triggering content-hub import ID", processId);
 
-            searchPaths = [];
-
-            var err = [];
             var path;
-            var res;
-            var success = true;
             var url;
 
             for (var i=0; i < importItems.length; i++) {
                 url = importItems[i].url.toString()
                 console.debug("Triggered content-hub import for item", url)
 
+                // Playlists are imported into the playlist database in the
+                // background rather than waiting for ms2 to find them
+                if (PlaylistFormats.isPlaylistFile(url)) {
+                    playlistTransfer.importFile(decodeFileURI(url.substring(7)))
+                    continue
+                }
+
                 // fixed path allows for apparmor protection
                 path = "~/Music/Imported/" + Qt.formatDateTime(new Date(), "yyyy/MM/dd/hhmmss") + "-" + url.split("/").pop()
-                res = contentHub.importFile(importItems[i], path)
+                contentHubImport.moves.push({item: importItems[i], path: path, url: url})
+                contentHubImport.total++
+            }
+
+            // tell content-hub we are finished with the files once they are moved
+            contentHubImport.moves.push({transfer: activeImportTransfer})
+            contentHubImport.begin(processId)
+        }
+    }
+
+    Timer {  // move the imported files in batches, one batch per event loop tick
+        id: contentHubImport
+        interval: 0
+        repeat: true
+
+        property int batchSize: 10
+        property var errors: []
+        property int moved: 0
+        property var moves: []  // files to move followed by the transfer to finalize
+        property int total: 0  // files to move in this import
+
+        function begin(processId) {
+            // Only wait for ms2 when there are files to move, imported
+            // playlists just need the transfer finalizing
+            if (contentHubWaitForFile.processId === -1 && total > 0) {
+                contentHubWaitForFile.dialog = PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubWaitDialog.qml"), mainView)
+                contentHubWaitForFile.processId = processId;
+            }
+
+            contentHubWaitForFile.updateDialog();
+            start();
+        }
+
+        onTriggered: {
+            var count = 0;
+            var move;
+            var res;
+
+            while (count < batchSize && moves.length > 0) {
+                move = moves.shift();
+
+                if (move.transfer !== undefined) {
+                    move.transfer.finalize();
+                    continue;
+                }
+
+                res = contentHub.importFile(move.item, move.path)
 
                 if (res !== true) {
-                    success = false;
-                    err.push(url.split("/").pop() + " " + res)
+                    errors.push(move.url.split("/").pop() + " " + res)
                 }
+
+                moved++;
+                count++;
             }
 
+            contentHubWaitForFile.updateDialog();
 
-            if (success === true) {
-                if (contentHubWaitForFile.processId === -1) {
-                    contentHubWaitForFile.dialog = PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubWaitDialog.qml"), mainView)
-                    contentHubWaitForFile.searchPaths = contentHub.searchPaths;
-                    contentHubWaitForFile.processId = processId;
-                    contentHubWaitForFile.start();
-                } else {
-                    contentHubWaitForFile.searchPaths.push.apply(contentHubWaitForFile.searchPaths, contentHub.searchPaths);
-                    contentHubWaitForFile.count = 0;
-                    contentHubWaitForFile.restart();
+            if (moves.length === 0) {
+                stop();
+
+                if (errors.length > 0) {
+                    var errordialog = PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubErrorDialog.qml"), mainView)
+                    errordialog.errorText = errors.join("\n")
                 }
+
+                errors = [];
+
+                // Files may have already been found by ms2 while moving
+                contentHubWaitForFile.check();
             }
-            else {
-                var errordialog = PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubErrorDialog.qml"), mainView)
-                errordialog.errorText = err.join("\n")
-            }
+        }
+    }
 
-            // tell content-hub we are finished with the files
-            activeImportTransfer.finalize();
+    Connections {  // the songs model is refilled when ms2 finds new files
+        target: allSongsModelModel
+        onFilled: {
+            if (contentHubWaitForFile.waitingCount > 0) {
+                contentHubWaitForFile.check();
+            }
         }
     }
 
-    Timer {
+    Timer {  // give up waiting for ms2 when no more files are found for 10s
         id: contentHubWaitForFile
-        interval: 1000
+        interval: 10000
         triggeredOnStart: false
-        repeat: true
+        repeat: false
 
         property var dialog: null
-        property var searchPaths
-        property int count: 0
         property int processId: -1
+        property var searchPaths: []  // moved files in the order they were imported
+        property var waiting: ({})  // moved files not yet found by ms2
+        property int waitingCount: 0
 
-        function stopTimer() {
-            processId = -1;
-            count = 0;
-            stop();
+        function addPath(path) {
+            searchPaths.push(path);
+            waiting[path] = true;
+            waitingCount++;
 
-            PopupUtils.close(dialog)
+            restart();
         }
 
-        onTriggered: {
-            var found = true
-            var i;
-            var model;
-
-            for (i=0; i < searchPaths.length; i++) {
-                model = musicStore.lookup(decodeFileURI(searchPaths[i]))
+        function check() {
+            var path;
 
-                console.debug("MusicStore model from lookup", JSON.stringify(model))
+            for (path in waiting) {
+                if (musicStore.lookup(decodeFileURI(path))) {
+                    delete waiting[path];
+                    waitingCount--;
 
-                if (!model) {
-                    found = false
+                    restart();  // still making progress
                 }
             }
 
-            if (!found) {
-                count++;
+            updateDialog();
 
-                if (count >= 10) {  // wait for 10s
-                    stopTimer();
+            if (contentHubImport.running || waitingCount > 0) {
+                return;
+            } else if (searchPaths.length > 0) {
+                finish();
+            } else {
+                cancel();  // nothing was moved
+            }
+        }
 
-                    console.debug("File(s) were not found", JSON.stringify(searchPaths))
-                    PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubNotFoundDialog.qml"), mainView)
-                }
+        function cancel() {
+            processId = -1;
+            searchPaths = [];
+            waiting = {};
+            waitingCount = 0;
+            contentHubImport.moved = 0;
+            contentHubImport.total = 0;
+
+            stop();
+
+            if (dialog !== null) {
+                PopupUtils.close(dialog)
+                dialog = null;
             }
-            else {
-                stopTimer();
+        }
+
+        function finish() {
+            var i;
+            var items = [];
 
-                player.mediaPlayer.playlist.clearWrapper();
+            for (i=0; i < searchPaths.length; i++) {
+                // Don't need to check if in ms2 as that is done above
+                items.push(Qt.resolvedUrl(decodeURIComponent(searchPaths[i])))
+            }
 
-                var items = [];
+            cancel();
 
-                for (i=0; i < searchPaths.length; i++) {
-                    // Don't need to check if in ms2 as that is done above
-                    items.push(Qt.resolvedUrl(decodeURIComponent(searchPaths[i])))
-                }
+            player.mediaPlayer.playlist.clearWrapper();
+            player.mediaPlayer.playlist.addItemsWrapper(items);
+
+            trackQueueClick(0);
 
-                player.mediaPlayer.playlist.addItems(items);
+            // Show the Now playing page and make sure the track is visible
+            tabs.pushNowPlaying();
+        }
+
+        function updateDialog() {
+            if (dialog !== null) {
+                dialog.total = contentHubImport.total;
+                dialog.moved = contentHubImport.moved;
+                dialog.found = searchPaths.length - waitingCount;
+                dialog.imported = searchPaths.length;
+            }
+        }
 
-                trackQueueClick(0);
+        // Reopen the dialog and carry on waiting after the files were not found
+        function wait() {
+            dialog = PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubWaitDialog.qml"), mainView)
+            updateDialog();
+            restart();
+        }
+
+        onTriggered: {
+            console.debug("File(s) were not found", JSON.stringify(Object.keys(waiting)))
 
-                // Show the Now playing page and make sure the track is visible
-                tabs.pushNowPlaying();
+            if (dialog !== null) {
+                PopupUtils.close(dialog)
+                dialog = null;
             }
+
+            PopupUtils.open(Qt.resolvedUrl("../Dialog/ContentHubNotFoundDialog.qml"), mainView)
         }
     }
 }
@@ -0,0 +1,281 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import QtQuick.LocalStorage 2.0
+import Ubuntu.MediaScanner 0.1
+import "../../logic/meta-database.js" as Library
+import "../../logic/playlists.js" as Playlists
+import "../../logic/storage.js" as Storage
+
+
+// Finds the tracks that have been removed from mediascanner2 between fills
+// of the songs model and removes only those from the queue, playlists and
+// recent, then refreshes the metadata stored with the recent items. The
+// model is scanned in batches so the UI is not blocked. After the first
+// scan, which has nothing to compare against, the tracks of the playlists
+// are checked against it in batches as well.
+Item {
+    id: libraryChanges
+
+    property bool active: true  // when false fills are only scanned once it is set
+    property int batchSize: 500
+    property bool firstScan: true
+    property var model: null  // SongsModel of all the tracks
+    property bool pendingScan: false
+    property int pruneBatchSize: 1000  // playlist filenames checked per tick
+    property var pruneState: null  // {after, files, missing} while checking the playlists
+
+    property var knownFiles: ({})  // filename -> album at the last complete scan
+    property var scanAlbumRows: ({})  // album -> row of its first track in the current scan
+    property var scanAlbums: ({})  // album -> number of tracks in the current scan
+    property var scanFiles: ({})  // filename -> album in the current scan
+    property int scanIndex: 0
+
+    signal playlistsChanged(var playlists)
+    signal recentChanged()
+
+    Connections {
+        target: libraryChanges.model
+        onFilled: {
+            if (libraryChanges.active) {
+                libraryChanges.scan();
+            } else {
+                libraryChanges.pendingScan = true;
+            }
+        }
+    }
+
+    onActiveChanged: {
+        if (active && pendingScan) {
+            pendingScan = false;
+            scan();
+        }
+    }
+
+    Timer {  // process one batch of the model per event loop tick
+        id: scanTimer
+        interval: 0
+        repeat: true
+        onTriggered: libraryChanges.scanBatch()
+    }
+
+    Timer {  // check one batch of the playlist filenames per event loop tick
+        id: pruneTimer
+        interval: 0
+        repeat: true
+        onTriggered: libraryChanges.pruneBatch()
+    }
+
+    // Start (or restart if the model was refilled) scanning the model
+    function scan() {
+        scanAlbumRows = {};
+        scanAlbums = {};
+        scanFiles = {};
+        scanIndex = 0;
+
+        scanTimer.restart();
+    }
+
+    function scanBatch() {
+        var end = Math.min(scanIndex + batchSize, model.rowCount);
+
+        for (var i=scanIndex; i < end; i++) {
+            var album = model.get(i, SongsModel.RoleAlbum);
+
+            if (scanAlbums[album] === undefined) {
+                scanAlbumRows[album] = i;
+            }
+
+            scanFiles[model.get(i, SongsModel.RoleFilename)] = album;
+            scanAlbums[album] = (scanAlbums[album] || 0) + 1;
+        }
+
+        scanIndex = end;
+
+        if (scanIndex >= model.rowCount) {
+            scanTimer.stop();
+            reconcile();
+        }
+    }
+
+    // Compare the completed scan with the previous one and apply the removals
+    function reconcile() {
+        var changed;
+        var filename;
+        var removed = [];
+        var removedAlbums = {};
+
+        // The playlists and recent are updated in one commit of each database
+        Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+            if (firstScan) {
+                // Nothing to compare against, so check the playlists against
+                // this scan in the background
+                pruneState = {after: "", files: scanFiles, missing: []};
+                pruneTimer.start();
+                changed = [];
+            } else {
+                for (filename in knownFiles) {
+                    // Confirm with the store in case the model was only partially filled
+                    if (scanFiles[filename] === undefined && musicStore.lookup(filename) === null) {
+                        removed.push(filename);
+                        removedAlbums[knownFiles[filename]] = true;
+                    }
+                }
+
+                if (removed.length > 0) {
+                    console.debug("Removed from library:", JSON.stringify(removed));
+
+                    removeFromQueue(removed);
+                }
+
+                changed = removed.length > 0 ? Playlists.removeMissingFiles(removed) : [];
+            }
+
+            if (changed.length > 0) {
+                playlistsChanged(changed);
+            }
+
+            var recent = Library.getRecent();
+            var recentRemoved = removeFromRecent(recent, firstScan ? null : removedAlbums);
+
+            if (refreshRecent(recent) || recentRemoved) {
+                recentChanged();
+            }
+        });
+
+        knownFiles = scanFiles;
+        scanAlbumRows = {};
+        scanFiles = {};
+        firstScan = false;
+    }
+
+    // Check the next batch of playlist filenames against the first scan and
+    // remove those which are not in the store once all have been checked
+    function pruneBatch() {
+        var filenames = Playlists.getTrackFilenames(pruneState.after, pruneBatchSize);
+
+        for (var i=0; i < filenames.length; i++) {
+            // Confirm with the store in case the model was only partially filled
+            if (pruneState.files[trackCache.normalize(filenames[i])] === undefined &&
+                    trackCache.lookup(filenames[i]) === null) {
+                pruneState.missing.push(filenames[i]);
+            }
+        }
+
+        if (filenames.length === pruneBatchSize) {
+            pruneState.after = filenames[filenames.length - 1];
+            return;
+        }
+
+        var missing = pruneState.missing;
+
+        pruneTimer.stop();
+        pruneState = null;
+
+        if (missing.length > 0) {
+            console.debug("Removed from playlists:", JSON.stringify(missing));
+
+            var changed = Playlists.removeMissingFiles(missing);
+
+            if (changed.length > 0) {
+                playlistsChanged(changed);
+            }
+        }
+    }
+
+    // Remove any of the filenames from the play queue
+    function removeFromQueue(filenames) {
+        var files = {};
+        var i;
+        var indexes = [];
+
+        for (i=0; i < filenames.length; i++) {
+            files[filenames[i]] = true;
+        }
+
+        for (i=0; i < player.mediaPlayer.playlist.count; i++) {
+            var file = decodeFileURI(player.mediaPlayer.playlist.itemSource(i));
+
+            // ms2 doesn't expect the URI scheme so strip file://
+            if (file.indexOf("file://") === 0) {
+                file = file.substr(7);
+            }
+
+            if (files[file] === true) {
+                indexes.push(i);
+            }
+        }
+
+        if (indexes.length > 0) {
+            console.debug("Removed queue:", JSON.stringify(indexes));
+            player.mediaPlayer.playlist.removeItemsWrapper(indexes);
+        }
+    }
+
+    // Remove albums that no longer have any tracks from recent, only the
+    // albums given are checked unless albums is null
+    function removeFromRecent(recent, albums) {
+        var removed = [];
+
+        for (var i=0; i < recent.length; i++) {
+            if (recent[i].type === "album" && scanAlbums[recent[i].data] === undefined &&
+                    (albums === null || albums[recent[i].data] === true)) {
+                removed.push(recent[i].data);
+            }
+        }
+
+        if (removed.length > 0) {
+            console.debug("Removed recent:", JSON.stringify(removed));
+            Library.recentRemoveAlbums(removed);
+        }
+
+        return removed.length > 0;
+    }
+
+    // Refresh the display metadata stored with the recent items from the
+    // completed scan, only the items which changed are written
+    function refreshRecent(recent) {
+        var updated = [];
+
+        for (var i=0; i < recent.length; i++) {
+            var meta;
+
+            if (recent[i].type === "album" && scanAlbumRows[recent[i].data] !== undefined) {
+                meta = recentAlbumMeta(model.get(scanAlbumRows[recent[i].data], SongsModel.RoleModelData));
+            } else if (recent[i].type === "playlist") {
+                meta = recentPlaylistMeta(recent[i].data);
+            } else {
+                continue;
+            }
+
+            meta.data = recent[i].data;
+            meta.type = recent[i].type;
+
+            if ((meta.author || "") !== recent[i].author || (meta.artist || "") !== recent[i].artist ||
+                    JSON.stringify(meta.covers) !== recent[i].covers) {
+                updated.push(meta);
+            }
+        }
+
+        if (updated.length > 0) {
+            console.debug("Refreshed recent:", updated.length);
+            Library.updateRecent(updated);
+        }
+
+        return updated.length > 0;
+    }
+}
@@ -0,0 +1,164 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import Ubuntu.MediaScanner 0.1
+import "../../logic/tracing.js" as Tracing
+
+
+// Summary of each genre and album artist in the library (covers, album and
+// track counts and total duration) built in batches over the songs model
+// when it is filled. Only the rows that changed are updated after a refill,
+// so the pages can bind to plain rows instead of a model per delegate.
+Item {
+    id: librarySummary
+
+    property int batchSize: 500
+    property int coverCount: 4
+    property var model: null  // SongsModel of all the tracks
+    property int revision: 0  // incremented each time the summary is updated
+
+    // {genre|artist, covers (JSON), albums, tracks, duration}
+    property ListModel artists: ListModel { }
+    property ListModel genres: ListModel { }
+
+    property var artistRows: ({})  // artist -> row in artists
+    property var scanArtists: ({})
+    property var scanGenres: ({})
+    property int scanIndex: 0
+
+    Connections {
+        target: librarySummary.model
+        onFilled: librarySummary.scan()
+    }
+
+    Timer {  // process one batch of the model per event loop tick
+        id: scanTimer
+        interval: 0
+        repeat: true
+        onTriggered: librarySummary.scanBatch()
+    }
+
+    // Get the summary of an album artist, or null if it is unknown
+    function artist(name) {
+        var row = artistRows[name];
+
+        return row !== undefined ? artists.get(row) : null;
+    }
+
+    function scan() {
+        scanArtists = {};
+        scanGenres = {};
+        scanIndex = 0;
+
+        scanTimer.restart();
+    }
+
+    function add(summaries, key, file) {
+        var summary = summaries[key];
+
+        if (summary === undefined) {
+            summary = {albums: {}, albumCount: 0, covers: [], tracks: 0, duration: 0};
+            summaries[key] = summary;
+        }
+
+        if (summary.albums[file.album] === undefined) {
+            summary.albums[file.album] = true;
+            summary.albumCount++;
+
+            if (summary.covers.length < coverCount) {
+                summary.covers.push({art: file.art});
+            }
+        }
+
+        summary.tracks++;
+        summary.duration += file.duration;
+    }
+
+    function scanBatch() {
+        var end = Math.min(scanIndex + batchSize, model.rowCount);
+
+        for (var i=scanIndex; i < end; i++) {
+            var file = model.get(i, SongsModel.RoleModelData);
+
+            add(scanArtists, file.albumArtist, file);
+
+            if (file.genre !== "") {
+                add(scanGenres, file.genre, file);
+            }
+        }
+
+        scanIndex = end;
+
+        if (scanIndex >= model.rowCount) {
+            scanTimer.stop();
+
+            var span = Tracing.begin("updateLibrarySummary");
+
+            artistRows = update(artists, "artist", scanArtists);
+            update(genres, "genre", scanGenres);
+
+            scanArtists = {};
+            scanGenres = {};
+            revision++;
+
+            Tracing.end(span);
+        }
+    }
+
+    // Update the rows of listModel to the summaries, only touching rows that
+    // changed, and return the map of key -> row
+    function update(listModel, role, summaries) {
+        var i;
+        var key;
+        var rows = {};
+
+        // Remove the rows which no longer exist
+        for (i=listModel.count - 1; i >= 0; i--) {
+            if (summaries[listModel.get(i)[role]] === undefined) {
+                listModel.remove(i);
+            }
+        }
+
+        for (i=0; i < listModel.count; i++) {
+            rows[listModel.get(i)[role]] = i;
+        }
+
+        for (key in summaries) {
+            var summary = summaries[key];
+            var covers = JSON.stringify(summary.covers);
+
+            if (rows[key] === undefined) {
+                var row = {covers: covers, albums: summary.albumCount,
+                           tracks: summary.tracks, duration: summary.duration};
+
+                row[role] = key;
+                rows[key] = listModel.count;
+                listModel.append(row);
+            } else {
+                var item = listModel.get(rows[key]);
+
+                if (item.covers !== covers || item.albums !== summary.albumCount ||
+                        item.tracks !== summary.tracks || item.duration !== summary.duration) {
+                    listModel.set(rows[key], {covers: covers, albums: summary.albumCount,
+                                              tracks: summary.tracks, duration: summary.duration});
+                }
+            }
+        }
+
+        return rows;
+    }
+}
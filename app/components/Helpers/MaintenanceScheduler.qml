@@ -0,0 +1,97 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import "../../logic/maintenance.js" as Maintenance
+
+
+// Runs the maintenance tasks of the databases once the app has been idle
+// for a while. Tasks are run in slices, each taking no more than the time
+// budget, with a gap between them so input is handled in between. Any
+// interaction postpones the remaining tasks until the app is idle again.
+Item {
+    id: maintenanceScheduler
+
+    property bool active: false  // set once startup has finished
+    property int budget: 50  // ms of maintenance in each slice
+    property int idleDelay: 30000  // ms without interaction before starting
+    property int recentSize: 50  // number of recent items kept
+    property int sliceGap: 250  // ms between slices
+    property real vacuumFreeRatio: 0.25  // fraction of free pages worth releasing
+
+    property var tasks: []  // tasks left to run in this idle period
+
+    onActiveChanged: {
+        if (active) {
+            idleTimer.restart();
+        } else {
+            idleTimer.stop();
+            sliceTimer.stop();
+        }
+    }
+
+    Timer {
+        id: idleTimer
+        interval: maintenanceScheduler.idleDelay
+        onTriggered: maintenanceScheduler.begin()
+    }
+
+    Timer {
+        id: sliceTimer
+        interval: maintenanceScheduler.sliceGap
+        onTriggered: maintenanceScheduler.runSlice()
+    }
+
+    // The user is interacting so wait until the app is idle again
+    function postpone() {
+        if (active) {
+            sliceTimer.stop();
+            idleTimer.restart();
+        }
+    }
+
+    function begin() {
+        if (tasks.length === 0) {
+            tasks = Maintenance.dueTasks(Date.now());
+        }
+
+        runSlice();
+    }
+
+    function runSlice() {
+        var start = Date.now();
+        var remaining = budget;
+
+        while (tasks.length > 0 && remaining > 0) {
+            var task = tasks.shift();
+            var res = Maintenance.runTask(task, {
+                budget: remaining,
+                recentSize: recentSize,
+                vacuumFreeRatio: vacuumFreeRatio
+            });
+
+            if (res === "partial") {  // carry on in the next slice
+                tasks.push(task);
+            }
+
+            remaining = budget - (Date.now() - start);
+        }
+
+        if (tasks.length > 0) {
+            sliceTimer.restart();
+        }
+    }
+}
@@ -0,0 +1,249 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import "../../logic/playlist-formats.js" as PlaylistFormats
+import "../../logic/playlists.js" as Playlists
+import "../../logic/tracing.js" as Tracing
+
+
+// Imports and exports M3U and XSPF playlists in batches across event loop
+// ticks. Imported entries are resolved against mediascanner2 and written to
+// the playlist database in large transactions, exported tracks are read from
+// it in batches and written to the file at the end. Transfers are run one at
+// a time in the order they were requested.
+Item {
+    id: playlistTransfer
+
+    property int batchSize: 500  // entries parsed or tracks read per tick
+    property int maxNameAttempts: 100  // numbered names tried for an import
+    property int transactionSize: 5000  // imported tracks written per transaction
+
+    readonly property bool busy: job !== null
+    property var job: null  // current transfer
+    property var jobs: []  // transfers waiting to start
+    property int missing: 0  // entries of the current import not in the library
+    property int processed: 0  // entries or tracks of the current transfer
+    property real progress: 0  // fraction of the current transfer that is done
+
+    signal failed(string path)
+    signal finished(string playlist, int count, int missing)
+
+    Timer {  // process one batch of the current transfer per event loop tick
+        id: transferTimer
+        interval: 0
+        repeat: true
+        onTriggered: playlistTransfer.step()
+    }
+
+    // Import the playlist file at path into a new playlist, named after the
+    // playlist or file when name is not given. The file is read straight
+    // away so it can be removed once this returns
+    function importFile(path, name) {
+        var text = readFile(path);
+
+        if (text === null) {
+            failed(path);
+            return;
+        }
+
+        jobs.push({type: "import", path: path, name: name || "", text: text});
+        startNext();
+    }
+
+    // Export the playlist to the file at path, in the format of its extension.
+    // There is no UI for this yet as the app can only write to the imported
+    // files folder, so it is only used by callers which choose the path
+    function exportPlaylist(playlist, path) {
+        jobs.push({type: "export", path: path, playlist: playlist});
+        startNext();
+    }
+
+    function readFile(path) {
+        var request = new XMLHttpRequest();
+
+        request.open("GET", "file://" + path, false);
+
+        try {
+            request.send();
+        } catch (err) {
+            console.debug("Unable to read playlist " + path + ": " + err);
+            return null;
+        }
+
+        return request.responseText;
+    }
+
+    function writeFile(path, text) {
+        var request = new XMLHttpRequest();
+
+        request.open("PUT", "file://" + path, false);
+
+        try {
+            request.send(text);
+        } catch (err) {
+            console.debug("Unable to write playlist " + path + ": " + err);
+            return false;
+        }
+
+        return true;
+    }
+
+    // Add the playlist, with a number after the name if it already exists.
+    // Returns the name used or null if the playlist could not be added
+    function addUniquePlaylist(name) {
+        var unique = name;
+
+        for (var i=2; i <= maxNameAttempts + 1; i++) {
+            if (Playlists.addPlaylist(unique)) {
+                return unique;
+            }
+
+            unique = name + " (" + i + ")";
+        }
+
+        console.debug("Unable to add playlist", name);
+
+        return null;
+    }
+
+    function startNext() {
+        if (job !== null || jobs.length === 0) {
+            return;
+        }
+
+        job = jobs.shift();
+        job.span = Tracing.begin(job.type === "import" ? "importPlaylist" : "exportPlaylist");
+
+        missing = 0;
+        processed = 0;
+        progress = 0;
+
+        if (job.type === "import") {
+            job.parser = PlaylistFormats.createParser(job.text, job.path);
+            job.playlist = addUniquePlaylist(job.name || job.parser.title ||
+                                             PlaylistFormats.nameFromPath(job.path));
+            job.pending = [];  // resolved tracks waiting to be written
+            job.text = null;
+
+            if (job.playlist === null) {
+                abort();
+                return;
+            }
+        } else {
+            job.after = 0;  // sort key of the last track read
+            job.parts = [PlaylistFormats.header(job.path, job.playlist)];
+            job.total = Playlists.getPlaylistCount(job.playlist);
+        }
+
+        console.debug("Starting playlist", job.type, job.path);
+
+        transferTimer.start();
+    }
+
+    function step() {
+        if (job.type === "import") {
+            importBatch();
+        } else {
+            exportBatch();
+        }
+    }
+
+    function importBatch() {
+        var entries = PlaylistFormats.nextEntries(job.parser, batchSize);
+
+        for (var i=0; i < entries.length; i++) {
+            var meta = trackCache.lookup(entries[i].filename);
+
+            if (meta === null) {
+                missing++;
+            } else {
+                job.pending.push({
+                    filename: meta.filename,
+                    title: meta.title,
+                    author: meta.author,
+                    album: meta.album,
+                    duration: meta.duration
+                });
+            }
+        }
+
+        processed += entries.length;
+        progress = PlaylistFormats.progress(job.parser);
+
+        if (job.pending.length >= transactionSize || job.parser.done) {
+            if (job.pending.length > 0) {
+                Playlists.addToPlaylistList(job.playlist, job.pending);
+            }
+
+            Tracing.count("playlistImported", job.pending.length);
+            job.pending = [];
+        }
+
+        if (job.parser.done) {
+            finish(processed - missing);
+        }
+    }
+
+    function exportBatch() {
+        var tracks = Playlists.getPlaylistTrackRange(job.playlist, job.after, batchSize);
+
+        if (tracks.length > 0) {
+            job.after = tracks[tracks.length - 1].i;
+            job.parts.push(PlaylistFormats.entries(job.path, tracks));
+        }
+
+        processed += tracks.length;
+        progress = job.total > 0 ? Math.min(processed / job.total, 1) : 1;
+
+        if (tracks.length < batchSize) {
+            job.parts.push(PlaylistFormats.footer(job.path));
+
+            if (writeFile(job.path, job.parts.join(""))) {
+                finish(processed);
+            } else {
+                abort();
+            }
+        }
+    }
+
+    // Stop the current transfer as it has failed and start the next one
+    function abort() {
+        var path = job.path;
+
+        transferTimer.stop();
+        Tracing.end(job.span);
+        job = null;
+
+        failed(path);
+        startNext();
+    }
+
+    function finish(count) {
+        var done = job;
+
+        transferTimer.stop();
+        Tracing.end(done.span, {count: count, missing: missing});
+
+        console.debug("Finished playlist", done.type, done.path, count, "tracks", missing, "missing");
+
+        job = null;
+        progress = 1;
+
+        finished(done.playlist, count, missing);
+        startNext();
+    }
+}
@@ -0,0 +1,149 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import Ubuntu.MediaScanner 0.1
+import "../../logic/tracing.js" as Tracing
+
+
+// Searches the full text index of mediascanner2 (media_fts over the title,
+// artist and album of tracks) and groups the ranked results into songs,
+// albums and artists. Queries are debounced so only the last query typed is
+// run, and setting a new query or calling cancel() discards a pending one.
+Item {
+    id: searchHelper
+
+    property int albumsLimit: 50
+    property int artistsLimit: 50
+    property int debounce: 250  // ms to wait for typing to pause
+    property int minimumPrefix: 2  // shorter terms only match whole words
+    property bool pending: searchTimer.running  // a query is waiting to run
+    property string query: ""  // query of the current results
+    property int resultsLimit: 1000  // tracks read from the index for each query
+    property int songsLimit: 200
+
+    property ListModel albums: ListModel { }  // {title, artist, art}
+    property ListModel artists: ListModel { }  // {artist}
+    property ListModel songs: ListModel { }  // {filename, title, author, album, art}
+
+    property string nextQuery: ""
+
+    signal finished()
+
+    Timer {
+        id: searchTimer
+        interval: searchHelper.debounce
+        onTriggered: searchHelper.run(searchHelper.nextQuery)
+    }
+
+    // Discard any pending query and the current results
+    function cancel() {
+        searchTimer.stop();
+        nextQuery = "";
+        run("");
+    }
+
+    // Search for text once typing pauses, an empty text clears the results
+    function search(text) {
+        text = text.trim();
+
+        if (text === "") {
+            cancel();
+        } else if (text !== query || searchTimer.running) {
+            nextQuery = text;
+            searchTimer.restart();
+        }
+    }
+
+    // Split the text into terms without any fts query syntax
+    function terms(text) {
+        return text.toLowerCase().replace(/["*^():\-]/g, " ").split(/\s+/).filter(function(term) {
+            return term !== "" && ["and", "or", "not", "near"].indexOf(term) === -1;
+        });
+    }
+
+    // Does a word of text start with any of the terms
+    function matches(text, queryTerms) {
+        var words = text.toLowerCase().split(/\s+/);
+
+        for (var i=0; i < queryTerms.length; i++) {
+            for (var j=0; j < words.length; j++) {
+                if (words[j].indexOf(queryTerms[i]) === 0) {
+                    return true;
+                }
+            }
+        }
+
+        return false;
+    }
+
+    function run(text) {
+        var queryTerms = terms(text);
+
+        songs.clear();
+        albums.clear();
+        artists.clear();
+        query = text;
+
+        if (queryTerms.length === 0) {
+            finished();
+            return;
+        }
+
+        var span = Tracing.begin("search", {query: text});
+
+        // Every term long enough is a prefix, as a short prefix such as a*
+        // matches most of a large library. mediascanner2 ranks the results
+        // by how well the title, artist and album match and stops at the
+        // limit, the query is synchronous so it must stay bounded
+        var ftsQuery = queryTerms.map(function(term) {
+            return term.length >= minimumPrefix ? term + "*" : term;
+        }).join(" ");
+        var results = musicStore.query(ftsQuery, MediaStore.AudioMedia, resultsLimit);
+        var seenAlbums = {};
+        var seenArtists = {};
+
+        for (var i=0; i < results.length; i++) {
+            var file = results[i];
+
+            if (songs.count < songsLimit) {
+                songs.append({filename: file.filename, title: file.title,
+                              author: file.author, album: file.album, art: file.art});
+            }
+
+            var albumKey = file.album + "\n" + file.albumArtist;
+
+            if (albums.count < albumsLimit && file.album !== "" && !seenAlbums[albumKey] && matches(file.album, queryTerms)) {
+                seenAlbums[albumKey] = true;
+                albums.append({title: file.album, artist: file.albumArtist, art: file.art});
+            }
+
+            // the artists page lists album artists
+            if (artists.count < artistsLimit && file.albumArtist !== "" && !seenArtists[file.albumArtist] && matches(file.albumArtist, queryTerms)) {
+                seenArtists[file.albumArtist] = true;
+                artists.append({artist: file.albumArtist});
+            }
+
+            if (songs.count >= songsLimit && albums.count >= albumsLimit && artists.count >= artistsLimit) {
+                break;
+            }
+        }
+
+        Tracing.end(span, {results: results.length});
+
+        finished();
+    }
+}
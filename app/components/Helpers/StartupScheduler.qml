@@ -0,0 +1,76 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import "../../logic/tracing.js" as Tracing
+
+
+// Runs work that is not needed for the first frame after startup, one task
+// per event loop tick so the UI stays responsive between tasks
+Item {
+    id: startupScheduler
+
+    property int delay: 250  // ms to wait after start() so the first frame is drawn
+    property bool finished: false
+    property var tasks: []  // list of {name, func} to run in order
+
+    Timer {
+        id: taskTimer
+        onTriggered: startupScheduler.runNext()
+    }
+
+    // Queue func to run in the deferred phase, or on the next tick if
+    // the phase has already finished
+    function defer(name, func) {
+        tasks.push({name: name, func: func});
+
+        if (finished) {
+            finished = false;
+            taskTimer.interval = 0;
+            taskTimer.restart();
+        }
+    }
+
+    function runNext() {
+        var task = tasks.shift();
+
+        if (task !== undefined) {
+            var span = Tracing.begin(task.name);
+
+            // a failing task must not stop the tasks after it
+            try {
+                task.func();
+            } catch (e) {
+                console.warn("Startup task", task.name, "failed:", e);
+            } finally {
+                Tracing.end(span);
+            }
+        }
+
+        if (tasks.length > 0) {
+            taskTimer.interval = 0;
+            taskTimer.restart();
+        } else {
+            finished = true;
+        }
+    }
+
+    // Start the deferred phase
+    function start() {
+        taskTimer.interval = delay;
+        taskTimer.restart();
+    }
+}
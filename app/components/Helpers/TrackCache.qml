@@ -0,0 +1,134 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+import QtQuick 2.4
+import Ubuntu.MediaScanner 0.1
+import "../../logic/tracing.js" as Tracing
+
+
+// Cache of the mediascanner2 metadata of tracks by filename, the least
+// recently used entries are evicted once it is full. Filenames that are not
+// in the store are cached as null. The cache is cleared whenever the model
+// is filled as the store has changed.
+Item {
+    id: trackCache
+
+    property int maxSize: 2000
+    property var model: null  // SongsModel that is filled when the store changes
+    property int size: 0
+
+    // filename -> {key, value, newer, older} with a linked list of the
+    // entries from the most (head) to the least (tail) recently used
+    property var entries: ({})
+    property var head: null
+    property var tail: null
+
+    Connections {
+        target: trackCache.model
+        onFilled: trackCache.invalidate()
+    }
+
+    // Convert a source or filename into the filename that ms2 expects
+    function normalize(filename) {
+        filename = filename.toString();
+
+        // ms2 doesn't expect the URI scheme so strip file://
+        if (filename.indexOf("file://") === 0) {
+            filename = filename.substring(7);
+        }
+
+        return decodeFileURI(filename);
+    }
+
+    function unlink(entry) {
+        if (entry.newer !== null) {
+            entry.newer.older = entry.older;
+        } else {
+            head = entry.older;
+        }
+
+        if (entry.older !== null) {
+            entry.older.newer = entry.newer;
+        } else {
+            tail = entry.newer;
+        }
+    }
+
+    function pushHead(entry) {
+        entry.newer = null;
+        entry.older = head;
+
+        if (head !== null) {
+            head.newer = entry;
+        }
+
+        head = entry;
+
+        if (tail === null) {
+            tail = entry;
+        }
+    }
+
+    // Get the metadata of the file, or null if it is not in the store
+    function lookup(filename) {
+        var key = normalize(filename);
+        var entry = entries[key];
+
+        if (entry !== undefined) {
+            if (entry !== head) {
+                unlink(entry);
+                pushHead(entry);
+            }
+
+            return entry.value;
+        }
+
+        Tracing.count("trackCacheMiss");
+
+        entry = {key: key, value: musicStore.lookup(key), newer: null, older: null};
+        entries[key] = entry;
+        pushHead(entry);
+        size++;
+
+        if (size > maxSize) {
+            var oldest = tail;
+
+            unlink(oldest);
+            delete entries[oldest.key];
+            size--;
+        }
+
+        return entry.value;
+    }
+
+    // Get the metadata of a list of files, null for those not in the store
+    function lookupBatch(filenames) {
+        var res = [];
+
+        for (var i=0; i < filenames.length; i++) {
+            res.push(lookup(filenames[i]));
+        }
+
+        return res;
+    }
+
+    function invalidate() {
+        entries = {};
+        head = null;
+        tail = null;
+        size = 0;
+    }
+}
@@ -53,7 +53,7 @@ Item {
 
     function processFile(uri, play) {
         // Lookup track in songs model
-        var track = musicStore.lookup(decodeFileURI(uri));
+        var track = trackCache.lookup(uri);
 
         if (!track) {
             console.debug("Unknown file " + uri + ", skipping")
@@ -64,7 +64,7 @@ Item {
             }
 
             // enqueue
-            player.mediaPlayer.playlist.addItem(Qt.resolvedUrl(track.filename));
+            player.mediaPlayer.playlist.addItemsWrapper([Qt.resolvedUrl(track.filename)]);
 
             // play first URI
             if (play) {
@@ -36,7 +36,6 @@ Item {
 
     property alias canLoad: worker.canLoad
     property alias preLoadComplete: worker.preLoadComplete
-    property alias syncFactor: worker.syncFactor
     property alias workerComplete: worker.completed
     property alias workerList: worker.list
 
@@ -49,6 +48,16 @@ Item {
         model: libraryListModelItem.model
     }
 
+    Connections {
+        target: libraryModel
+        onRowsMoved: {
+            // Rows outside of the moved span keep their position, so only
+            // reindex the span (row is the destination of the move)
+            reindexRows(Math.min(start, row), Math.min(Math.max(end, row), libraryModel.count - 1))
+        }
+        onRowsRemoved: reindexRows(0, libraryModel.count - 1)
+    }
+
     function indexOf(file)
     {
         file = file.toString();
@@ -58,15 +67,42 @@ Item {
             file = file.slice(7, file.length)
         }
 
-        for (var i=0; i < model.count; i++)
-        {
-            if (model.get(i).file == file)
-            {
-                return i;
+        var row = worker.rowIndex[file];
+
+        // The loader indexes rows as they are sent, so the row may not have
+        // been appended yet
+        return row !== undefined && row < model.count ? row : -1;
+    }
+
+    // Rebuild the index for the rows from first to last, the set of files in
+    // the span must be the same as before it changed
+    function reindexRows(first, last)
+    {
+        var index = worker.rowIndex;
+        var key;
+        var i;
+
+        if (first === 0 && last === model.count - 1) {
+            index = {};
+        } else {
+            for (key in index) {
+                if (index[key] >= first && index[key] <= last) {
+                    delete index[key];
+                }
+            }
+        }
+
+        for (i=first; i <= last; i++) {
+            var item = model.get(i);
+
+            key = item.filename !== undefined ? item.filename : item.file;
+
+            if (key !== undefined && !index.hasOwnProperty(key)) {
+                index[key] = i;
             }
         }
 
-        return -1;
+        worker.rowIndex = index;
     }
 
     function filterPlaylists() {
@@ -76,8 +112,7 @@ Item {
         query = Playlists.getPlaylists
         param = null
 
-        // Set syncFactor to the default and set the list to populate
-        worker.syncFactor = 5
+        // Set the list to populate
         worker.list = Playlists.getPlaylists();
     }
 
@@ -88,9 +123,7 @@ Item {
         query = Playlists.getPlaylistTracks
         param = playlist
 
-        // Set syncFactor to 500 to get the worker to fetch many items at once and
-        // set the list to populate
-        worker.syncFactor = 500
+        // Set the list to populate
         worker.list = Playlists.getPlaylistTracks(playlist);
     }
 
@@ -101,8 +134,7 @@ Item {
         query = Library.getRecent
         param = null
 
-        // Set syncFactor to the default and set the list to populate
-        worker.syncFactor = 5
+        // Set the list to populate
         worker.list = Library.getRecent();
     }
 }
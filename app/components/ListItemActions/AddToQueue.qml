@@ -29,6 +29,6 @@ Action {
 
     onTriggered: {
         console.debug("Debug: Add track to queue: " + model)
-        player.mediaPlayer.playlist.addItem(Qt.resolvedUrl(model.filename))
+        player.mediaPlayer.playlist.addItemsWrapper([Qt.resolvedUrl(model.filename)])
     }
 }
@@ -41,6 +41,18 @@ Item {
         }
         art: albumImage.firstSource
         color: backgroundColor
+        prefetchArt: {  // the art of the next track in the queue
+            var playlist = player.mediaPlayer.playlist;
+
+            if (playlist.itemCount < 2) {
+                return "";
+            }
+
+            var next = player.shuffle ? playlist.shuffleIndex(playlist.currentIndex, 1, true)
+                                      : (playlist.currentIndex + 1) % playlist.itemCount;
+
+            return next === -1 ? "" : player.metaForSource(playlist.itemSource(next)).art;
+        }
         height: parent.height - (sidebar ? units.gu(7) + nowPlayingWideAspectLabelsBackground.height  : units.gu(7))
 
         Item {
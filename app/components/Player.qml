@@ -22,6 +22,7 @@ import Qt.labs.settings 1.0
 
 import QtQuick.LocalStorage 2.0
 import "../logic/meta-database.js" as Library
+import "../logic/tracing.js" as Tracing
 
 Item {
     objectName: "player"
@@ -62,15 +63,49 @@ Item {
             title: ""
         };
 
-        source = source.toString();
+        return trackCache.lookup(source) || blankMeta;
+    }
+
+    Timer {  // stream the rest of the restored queue in one chunk per event loop tick
+        id: queueRestoreTimer
+        interval: 0
+        repeat: true
+        onTriggered: mediaPlayerPlaylist.restoreNextChunk(mediaPlayerPlaylist.restoreChunkSize)
+    }
 
-        if (source.indexOf("file://") === 0) {
-            source = source.substring(7);
+    Timer {  // stream the rest of a model being added in one chunk per event loop tick
+        id: queueEnqueueTimer
+        interval: 0
+        repeat: true
+        onTriggered: mediaPlayerPlaylist.enqueueNextChunk()
+    }
+
+    Timer {  // coalesce the signals from the playlist into one save per event loop tick
+        id: queueSaveTimer
+        interval: 0
+        onTriggered: mediaPlayerPlaylist.saveQueue()
+    }
+
+    Connections {  // ensure the queue is saved before the app is suspended
+        target: Qt.application
+        onStateChanged: {
+            if (Qt.application.state !== Qt.ApplicationActive) {
+                mediaPlayerPlaylist.saveQueue();
+            }
         }
+    }
 
-        return musicStore.lookup(decodeFileURI(source)) || blankMeta;
+    Connections {  // save any changes made to the queue before the UI loaded
+        target: mainView
+        onLoadedUIChanged: {
+            if (mainView.loadedUI && mediaPlayerPlaylist.queueDirty) {
+                queueSaveTimer.start();
+            }
+        }
     }
 
+    Component.onDestruction: mediaPlayerPlaylist.saveQueue()
+
     Settings {
         id: settings
         category: "PlayerSettings"
@@ -85,7 +120,7 @@ Item {
             id: mediaPlayerPlaylist
             playbackMode: {
                 if (settings.shuffle) {
-                    Playlist.Random
+                    Playlist.CurrentItemOnce  // the shuffle order is followed by the app
                 } else if (settings.repeat) {
                     Playlist.Loop
                 } else {
@@ -109,7 +144,22 @@ Item {
             readonly property bool empty: itemCount === 0
             property int pendingCurrentIndex: -1
             property var pendingCurrentState: null
-            property int pendingShuffle: -1
+            property var pendingMove: null  // {from, to} of the move being made by moveItemWrapper()
+            property int enqueueChunkSize: 500
+            property var enqueueState: null
+            property int enqueueWindow: 25  // items either side of the tapped item that are queued first
+            property var pendingQueueChanges: []
+            property bool queueDirty: false  // queue changed before the UI loaded so it is saved in full
+            property int restoreChunkSize: 200
+            property bool restoring: false  // true while the queue is streamed in by restoreQueue()
+            property var restoreState: null
+            property int restoringCount: 0  // items restored from the database which must not be saved again
+            property var pendingShuffleFirst: -1  // position of the item being added which starts the shuffle order
+            property var pendingShuffleKeys: null  // stored keys of the items being restored
+            property var shuffleKeys: []  // key of each item, the shuffle order is the items sorted by key
+            // order of the items by key, built when needed. It is held in an object that is never
+            // reassigned so that building it does not notify bindings which are reading it
+            property var shuffleCache: ({order: null})
 
             onCurrentItemSourceChanged: {
                 var meta = metaForSource(currentItemSource);
@@ -124,12 +174,40 @@ Item {
                 mediaPlayerObject._calcProgress();
             }
             onItemChanged: {
-                console.debug("*** Saving play queue in onItemChanged");
-                saveQueue()
+                if (pendingMove !== null) {  // only the moved item has changed position
+                    shuffleKeys.splice(pendingMove.to, 0, shuffleKeys.splice(pendingMove.from, 1)[0]);
+                    shuffleCache.order = null;
+                    recordQueueChange("move", pendingMove.from, pendingMove.to);
+                    pendingMove = null;
+                    return;
+                }
+
+                // the items keep their place in the shuffle order
+                recordQueueChange("change", start, end)
             }
             onItemInserted: {
+                var keys = [];
+
+                for (var i=start; i <= end; i++) {
+                    if (i === pendingShuffleFirst) {
+                        keys.push(firstShuffleKey());
+                    } else if (pendingShuffleKeys !== null && typeof pendingShuffleKeys[i - start] === "number") {
+                        keys.push(pendingShuffleKeys[i - start]);
+                    } else {
+                        keys.push(newShuffleKey());
+                    }
+                }
+
+                if (pendingShuffleFirst >= start && pendingShuffleFirst <= end) {
+                    pendingShuffleFirst = -1;
+                }
+
+                pendingShuffleKeys = null;
+                shuffleKeys.splice.apply(shuffleKeys, [start, 0].concat(keys));
+                shuffleCache.order = null;
+
                 // When add to queue is done on an empty list currentIndex needs to be set
-                if (start === 0 && currentIndex === -1 && pendingCurrentIndex < 1 && pendingShuffle === -1) {
+                if (start === 0 && currentIndex === -1 && pendingCurrentIndex < 1) {
                     currentIndex = 0;
 
                     pendingCurrentIndex = -1;
@@ -144,36 +222,248 @@ Item {
                     processPendingCurrentState();
                 }
 
-                // Check if there is pending shuffle
-                // pendingShuffle holds the expected size of the model
-                if (pendingShuffle > -1 && pendingShuffle <= itemCount) {
-                    pendingShuffle = -1;
+                recordQueueChange("insert", start, end)
+            }
+            onItemRemoved: {
+                shuffleKeys.splice(start, end - start + 1);
+                shuffleCache.order = null;
 
-                    nextWrapper();  // find a random track
-                    mediaPlayerObject.play();  // next does not enforce play
+                // Keep the items before the window being streamed in next to it
+                if (enqueueState !== null && start < enqueueState.insertAt) {
+                    enqueueState.insertAt -= Math.min(end + 1, enqueueState.insertAt) - start;
                 }
 
-                console.debug("*** Saving play queue in onItemInserted");
-                saveQueue()
-            }
-            onItemRemoved: {
-                console.debug("*** Saving play queue in onItemRemoved");
-                saveQueue()
+                recordQueueChange("remove", start, end)
             }
 
             function addItemsFromModel(model) {
-                var items = []
+                enqueueFromModel(model, 0, false);
+            }
 
+            // Add the items to the end of the queue, while the restored queue
+            // or a model is being streamed in after its first items they are
+            // held back until it has been so that they stay after it
+            function addItemsWrapper(items) {
+                if (restoring && restoreState.after !== -1) {
+                    restoreState.appended.push.apply(restoreState.appended, items);
+                } else if (enqueueState !== null && enqueueState.after < enqueueState.model.rowCount) {
+                    enqueueState.appended.push.apply(enqueueState.appended, items);
+                } else {
+                    addItems(items);
+                }
+            }
+
+            // Add the items of the model to the shuffle order starting at a
+            // random item, which is played as soon as it is queued while the
+            // rest of the model is streamed in
+            function addShuffledItemsFromModel(model) {
                 // TODO: remove once playlists uses U1DB
                 if (model.hasOwnProperty("linkLibraryListModel")) {
                     model = model.linkLibraryListModel;
                 }
 
-                for (var i=0; i < model.rowCount; i++) {
-                    items.push(Qt.resolvedUrl(model.get(i, model.RoleModelData).filename));
+                if (model.rowCount === 0) {
+                    return;
                 }
 
-                player.mediaPlayer.playlist.addItems(items);
+                enqueueFromModel(model, Math.floor(Math.random() * model.rowCount), true, true);
+                setPendingCurrentState(MediaPlayer.PlayingState);
+            }
+
+            // Add the items of the model to the queue starting with the window
+            // of items around index so that it can be played straight away,
+            // the items after the window and then the items before it are
+            // streamed in the background. When current is true the item at
+            // index becomes the current item once it is queued, and when
+            // shuffleFirst is true it is put first in the shuffle order
+            function enqueueFromModel(model, index, current, shuffleFirst) {
+                // Any model still being added is queued first to keep the order
+                finishEnqueue();
+
+                // TODO: remove once playlists uses U1DB
+                if (model.hasOwnProperty("linkLibraryListModel")) {
+                    model = model.linkLibraryListModel;
+                }
+
+                var start = Math.max(0, index - enqueueWindow);
+                var end = Math.min(model.rowCount, index + enqueueWindow + 1);
+
+                if (end <= start) {
+                    return;
+                }
+
+                if (current) {
+                    setCurrentIndex(itemCount + index - start);
+                }
+
+                if (shuffleFirst) {
+                    pendingShuffleFirst = itemCount + index - start;
+                }
+
+                enqueueState = {
+                    model: model,
+                    after: end,  // next model index after the window to add
+                    before: 0,  // next model index before the window to add
+                    windowStart: start,
+                    insertAt: itemCount,  // position to insert the items before the window
+                    appended: [],  // items added to the end by addItemsWrapper()
+                };
+
+                var span = Tracing.begin("enqueueWindow", {count: end - start});
+                addItems(itemsFromModel(model, start, end));
+                Tracing.end(span);
+
+                queueEnqueueTimer.start();
+            }
+
+            function enqueueNextChunk() {
+                var state = enqueueState;
+                var count = state.model.rowCount;
+                var end;
+                var items;
+
+                if (state.after < count) {
+                    end = Math.min(state.after + enqueueChunkSize, count);
+                    items = itemsFromModel(state.model, state.after, end);
+                    state.after = end;
+
+                    addItems(items);
+                } else if (state.appended.length > 0) {
+                    items = state.appended;
+                    state.appended = [];
+
+                    addItems(items);
+                } else if (state.before < state.windowStart) {
+                    end = Math.min(state.before + enqueueChunkSize, state.windowStart);
+                    items = itemsFromModel(state.model, state.before, end);
+                    state.before = end;
+
+                    insertItems(state.insertAt, items);
+                    state.insertAt += items.length;
+                } else {
+                    queueEnqueueTimer.stop();
+                    enqueueState = null;
+                    return;
+                }
+
+                Tracing.count("queueEnqueued", items.length);
+            }
+
+            // Add the rest of the model being streamed in straight away
+            function finishEnqueue() {
+                while (enqueueState !== null) {
+                    enqueueNextChunk();
+                }
+            }
+
+            // Add the items of the queue from the database without saving them again
+            function addRestoredItems(items, keys) {
+                restoringCount += items.length;
+                pendingShuffleKeys = keys;
+
+                var span = Tracing.begin("addRestoredItems", {count: items.length});
+                addItems(items);
+                Tracing.end(span);
+            }
+
+            function insertRestoredItems(index, items, keys) {
+                restoringCount += items.length;
+                pendingShuffleKeys = keys;
+
+                var span = Tracing.begin("insertRestoredItems", {count: items.length});
+                insertItems(index, items);
+                Tracing.end(span);
+            }
+
+            // Restore the queue from the database starting with the item at
+            // index so that it is current straight away, the items after it
+            // and then the items before it are streamed in the background
+            function restoreQueue(index) {
+                restoring = true;
+                restoreState = {
+                    index: index,  // database index of the first item
+                    after: index,  // next database index after the first item to read
+                    before: 0,  // next database index before the first item to read
+                    insertAt: 0,  // position to insert the items before the first item
+                    missing: [],  // database indexes of items no longer in ms2
+                    dirty: false,  // queue was changed by the user while restoring
+                    appended: [],  // items added to the end by addItemsWrapper()
+                };
+
+                pendingCurrentIndex = 0;  // the first restored item becomes current
+
+                // Load the first item now, if it no longer exists the next
+                // item that does becomes current as the chunks are streamed
+                restoreNextChunk(1);
+
+                queueRestoreTimer.start();
+            }
+
+            function restoreNextChunk(count) {
+                var state = restoreState;
+                var res;
+
+                if (state.after !== -1) {
+                    res = Library.getQueueRange(state.after, -1, count);
+
+                    if (res.last === -1) {
+                        state.after = -1;  // no more items after the first item
+                    } else {
+                        state.after = res.last + 1;
+
+                        if (res.items.length > 0) {
+                            addRestoredItems(res.items, res.keys);
+                        }
+                    }
+                } else if (state.appended.length > 0) {
+                    var appended = state.appended;
+
+                    // this marks the restore dirty so the queue is saved in full
+                    state.appended = [];
+                    addItems(appended);
+                    return;
+                } else if (state.before < state.index) {
+                    res = Library.getQueueRange(state.before, state.index, count);
+
+                    if (res.last === -1) {
+                        state.before = state.index;
+                    } else {
+                        state.before = res.last + 1;
+
+                        if (res.items.length > 0) {
+                            insertRestoredItems(state.insertAt, res.items, res.keys);
+                            state.insertAt += res.items.length;
+                        }
+                    }
+                } else {
+                    finishRestore();
+                    return;
+                }
+
+                state.missing.push.apply(state.missing, res.missing);
+                Tracing.count("queueRestored", res.items.length);
+            }
+
+            // Make the database match the restored queue
+            function finishRestore() {
+                var state = restoreState;
+
+                queueRestoreTimer.stop();
+
+                if (state.dirty) {
+                    var items = [];
+
+                    for (var i=0; i < itemCount; i++) {
+                        items.push(itemSource(i).toString());
+                    }
+
+                    Library.replaceQueue(items, shuffleKeys.slice());
+                } else if (state.missing.length > 0) {
+                    Library.removeQueueList(state.missing);
+                }
+
+                restoreState = null;
+                restoring = false;
             }
 
             // Wrap the clear() method because we need to call stop first
@@ -183,6 +473,17 @@ Item {
                     mediaPlayerObject.stop();
                 }
 
+                // Stop streaming in the restored queue, the database is
+                // brought up to date before the items are removed
+                if (restoring) {
+                    restoreState.dirty = true;
+                    finishRestore();
+                }
+
+                // Stop streaming in any model being added
+                queueEnqueueTimer.stop();
+                enqueueState = null;
+
                 clear();
             }
 
@@ -191,17 +492,41 @@ Item {
                 return metaForSource(itemSource(index));
             }
 
+            // Get the sources of the items of the model from start to end
+            function itemsFromModel(model, start, end) {
+                var items = []
+
+                // TODO: remove once playlists uses U1DB
+                if (model.hasOwnProperty("linkLibraryListModel")) {
+                    model = model.linkLibraryListModel;
+                }
+
+                for (var i=start; i < end; i++) {
+                    items.push(Qt.resolvedUrl(model.get(i, model.RoleModelData).filename));
+                }
+
+                return items;
+            }
+
             // Wrap the next() method so we can check canGoNext
             function nextWrapper() {
                 if (canGoNext) {
-                    next();
+                    if (settings.shuffle) {
+                        setShuffleIndex(shuffleIndex(currentIndex, 1, settings.repeat));
+                    } else {
+                        next();
+                    }
                 }
             }
 
             // Wrap the previous() method so we can check canGoPrevious
             function previousWrapper() {
                 if (canGoPrevious) {
-                    previous();
+                    if (settings.shuffle) {
+                        setShuffleIndex(shuffleIndex(currentIndex, -1, settings.repeat));
+                    } else {
+                        previous();
+                    }
                 }
             }
 
@@ -221,6 +546,16 @@ Item {
                 pendingCurrentState = null;
             }
 
+            // Wrapper for moveItem(from, to) so that the move is saved as a
+            // single move instead of a change of every item inbetween
+            function moveItemWrapper(from, to) {
+                if (from !== to) {
+                    pendingMove = {from: from, to: to};
+                    moveItem(from, to);
+                    pendingMove = null;
+                }
+            }
+
             // Wrapper for removeItems(from, to) so that we can use removeItems(list) until it is implemented upstream
             function removeItemsWrapper(items) {
                 var previous = -1, end = -1;
@@ -252,23 +587,88 @@ Item {
                 }
             }
 
-            function saveQueue(start, end) {
+            // Record a change of the play queue so that it is persisted on the next event loop tick
+            function recordQueueChange(type, start, end) {
                 // FIXME: load and save do not work yet pad.lv/1510225
                 // so use our localstorage method for now
                 // save("/home/phablet/.local/share/com.ubuntu.music/queue.m3u");
-                if (mainView.loadedUI) {
-                    // Don't be intelligent, just clear and rebuild the queue for now
-                    Library.clearQueue();
+                if (type === "insert" && restoringCount > 0) {
+                    restoringCount -= end - start + 1;
+                    return;
+                } else if (restoring) {
+                    // the positions do not match the database until the
+                    // restore has finished, so save the whole queue then
+                    restoreState.dirty = true;
+                    return;
+                } else if (!mainView.loadedUI) {
+                    // save the whole queue once the UI has loaded
+                    queueDirty = true;
+                    return;
+                }
+
+                var items = [];
+                var keys = type === "insert" ? shuffleKeys.slice(start, end + 1) : [];
+                var last = pendingQueueChanges.length > 0 ? pendingQueueChanges[pendingQueueChanges.length - 1] : null;
+
+                if (type === "insert" || type === "change") {
+                    for (var i=start; i <= end; i++) {
+                        items.push(itemSource(i).toString());
+                    }
+                }
+
+                // Merge bursts of contiguous changes into a single range
+                if (last !== null && last.type === "insert" && type === "insert" && start === last.end + 1) {
+                    last.items.push.apply(last.items, items);
+                    last.keys.push.apply(last.keys, keys);
+                    last.end = end;
+                } else if (last !== null && last.type === "remove" && type === "remove" && start === last.start) {
+                    last.end += end - start + 1;
+                } else if (last !== null && last.type === "remove" && type === "remove" && end + 1 === last.start) {
+                    last.start = start;
+                } else {
+                    pendingQueueChanges.push({type: type, start: start, end: end, items: items, keys: keys});
+                }
 
-                    var sources = [];
+                if (!queueSaveTimer.running) {
+                    queueSaveTimer.start();
+                }
+            }
+
+            // Write any pending queue changes to the database in one transaction
+            function saveQueue() {
+                queueSaveTimer.stop();
 
-                    for (var i=0; i < mediaPlayerPlaylist.itemCount; i++) {
-                        sources.push(mediaPlayerPlaylist.itemSource(i));
+                // The queue changed during the restore can only be saved once
+                // all of it has been read, finishRestore() then saves it
+                if (restoring && restoreState.dirty) {
+                    var restoreSpan = Tracing.begin("completeRestore");
+
+                    while (restoring) {
+                        restoreNextChunk(restoreChunkSize);
                     }
 
-                    if (sources.length > 0) {
-                        Library.addQueueList(sources);
+                    Tracing.end(restoreSpan);
+                }
+
+                if (queueDirty && !restoring) {
+                    var items = [];
+
+                    for (var i=0; i < itemCount; i++) {
+                        items.push(itemSource(i).toString());
                     }
+
+                    queueDirty = false;
+                    pendingQueueChanges = [];
+
+                    Library.replaceQueue(items, shuffleKeys.slice());
+                } else if (pendingQueueChanges.length > 0) {
+                    var changes = pendingQueueChanges;
+
+                    pendingQueueChanges = [];
+
+                    var span = Tracing.begin("saveQueue", {changes: changes.length});
+                    Library.applyQueueChanges(changes);
+                    Tracing.end(span);
                 }
             }
 
@@ -290,13 +690,86 @@ Item {
                 }
             }
 
-            function setPendingShuffle(modelSize) {
-                // Run next() and play() when the modelSize is reached
-                if (modelSize <= itemCount) {
-                    mediaPlayerPlaylist.nextWrapper();  // find a random track
-                    mediaPlayerObject.play();  // next does not enforce play
-                } else {
-                    pendingShuffle = modelSize;
+            // Get the index of the item after (direction 1) or before
+            // (direction -1) index in the shuffle order, or the first item in
+            // that direction when index is -1 or wrap is true and the end of
+            // the order has been reached, otherwise -1
+            function shuffleIndex(index, direction, wrap) {
+                var order = getShuffleOrder();
+
+                if (order.items.length === 0) {
+                    return -1;
+                }
+
+                var edge = direction > 0 ? 0 : order.items.length - 1;
+
+                if (index === -1) {
+                    return order.items[edge];
+                }
+
+                var position = order.positions[index] + direction;
+
+                if (position >= 0 && position < order.items.length) {
+                    return order.items[position];
+                }
+
+                return wrap ? order.items[edge] : -1;
+            }
+
+            // Get the items sorted by their shuffle key and the position of
+            // each item in that order, rebuilt after the queue has changed
+            function getShuffleOrder() {
+                if (shuffleCache.order === null) {
+                    var items = [];
+                    var positions = [];
+                    var i;
+
+                    for (i=0; i < shuffleKeys.length; i++) {
+                        items.push(i);
+                    }
+
+                    items.sort(function(a, b) {
+                        return shuffleKeys[a] !== shuffleKeys[b] ? shuffleKeys[a] - shuffleKeys[b] : a - b;
+                    });
+
+                    for (i=0; i < items.length; i++) {
+                        positions[items[i]] = i;
+                    }
+
+                    shuffleCache.order = {items: items, positions: positions};
+                }
+
+                return shuffleCache.order;
+            }
+
+            // Key of a new item in the shuffle order, a random place in it
+            function newShuffleKey() {
+                return Math.random();
+            }
+
+            // Key before all of the items in the shuffle order
+            function firstShuffleKey() {
+                var key = 0;
+
+                for (var i=0; i < shuffleKeys.length; i++) {
+                    key = Math.min(key, shuffleKeys[i]);
+                }
+
+                return key - 1;
+            }
+
+            // Move to the item at index from the shuffle order
+            function setShuffleIndex(index) {
+                if (index === -1) {
+                    return;
+                }
+
+                var playing = mediaPlayerObject.playbackState === MediaPlayer.PlayingState;
+
+                currentIndex = index;
+
+                if (playing) {
+                    mediaPlayerObject.play();
                 }
             }
         }
@@ -308,6 +781,18 @@ Item {
         onPositionChanged: _calcProgress()
 
         onStatusChanged: {
+            if (status == MediaPlayer.EndOfMedia && settings.shuffle) {
+                // Only the current item is played in shuffle mode so move to
+                // the next item in the shuffle order
+                var next = playlist.shuffleIndex(playlist.currentIndex, 1, settings.repeat);
+
+                if (next !== -1) {
+                    playlist.currentIndex = next;
+                    play();
+                    return;
+                }
+            }
+
             if (status == MediaPlayer.EndOfMedia && !settings.repeat) {
                 console.debug("End of media, stopping.")
 
@@ -327,7 +812,7 @@ Item {
             if (playlist.itemCount > 0) {
                 // We have just ended media so jump to start of playlist
                 if (endOfMedia) {
-                    playlist.currentIndex = 0;
+                    playlist.currentIndex = settings.shuffle ? playlist.shuffleIndex(-1, 1, false) : 0;
 
                     // Play then pause otherwise when we come from EndOfMedia
                     // if calls next() until EndOfMedia again
@@ -33,7 +33,7 @@ MultiSelectListView {
         fill: parent
         topMargin: units.gu(1)
     }
-    autoModelMove: false  // ensures we use moveItem() not move() in onReorder
+    autoModelMove: false  // ensures we use moveItemWrapper() not move() in onReorder
     footer: Item {
         height: mainView.height - (styleMusic.common.expandHeight + queueList.currentHeight) + units.gu(8)
     }
@@ -91,6 +91,6 @@ MultiSelectListView {
     onReorder: {
         console.debug("Move: ", from, to);
 
-        player.mediaPlayer.playlist.moveItem(from, to);
+        player.mediaPlayer.playlist.moveItemWrapper(from, to);
     }
 }
@@ -17,6 +17,7 @@
  */
 
 import QtQuick 2.4
+import "../logic/tracing.js" as Tracing
 
 
 WorkerScript {
@@ -24,24 +25,25 @@ WorkerScript {
      source: "../logic/worker-library-loader.js"
 
      property bool canLoad: true
+     property int chunkSize: 16  // number of items sent per message, adapted to fit in frameBudget
      property bool completed: false
+     property int frameBudget: 16  // time in ms a chunk should take to be appended
      property int i: 0
      property var list
+     property int maxChunkSize: 2048
      property var model
      property bool preLoadComplete: false
      property int processing: 0
-     property int syncFactor: 5
+     property var rowIndex: ({})  // filename -> first row it appears at in the model
+     property double sentTime: 0
+     property var span: null  // trace span of the message being processed
 
      onCanLoadChanged: {
          /* If canLoad has been set back to true then check if there are any
            remaining items to load in the model */
-         if (canLoad && list !== undefined && !completed) {
+         if (canLoad && list !== undefined && !completed && processing === 0) {
              process();
          }
-
-         if (!canLoad && i !== 0) {  // sync any pending changes when canLoad changes
-             sync()
-         }
      }
 
      onListChanged: {
@@ -50,64 +52,73 @@ WorkerScript {
      }
 
      onMessage: {
-         if (messageObject.sync === true) {
-             if (list !== undefined && i >= list.length) {  // if synced check if list now complete
-                 completed = true
-             }
-
-             processing--;
-
-             return;  // do not continue from a sync 'pong' only from a process/clear
-         }
+         processing--;
+         Tracing.end(span);
 
-         if (i === 0) {
+         if (i === 0) {  // reply from a clear
              preLoadComplete = true;
+         } else {
+             adaptChunkSize(Date.now() - sentTime);
          }
 
-         if (canLoad && i % syncFactor === 0 && i !== 0) {
-             sync();
-         }
-
-         if (canLoad) {  // pause if the model is not allowed to load
+         if (list !== undefined && i >= list.length) {
+             completed = processing === 0;
+         } else if (canLoad) {  // pause if the model is not allowed to load
              process();
          }
+     }
 
-         if (i === 1) {  // sync after the first item to prevent empty states
-             sync()
+     // Grow the chunks while they are appended within the budget, otherwise shrink them
+     function adaptChunkSize(elapsed)
+     {
+         if (elapsed < frameBudget / 2) {
+             chunkSize = Math.min(chunkSize * 2, maxChunkSize);
+         } else if (elapsed > frameBudget) {
+             chunkSize = Math.max(Math.floor(chunkSize / 2), 1);
          }
-
-         processing--;  // minus at end to cause count to go 1->2->1 not 1->0->1
      }
 
      function clear() {
          if (list !== undefined) {
+             rowIndex = {};
              processing++
+             span = Tracing.begin("clearModel");
              sendMessage({'clear': true, 'model': model})
          }
      }
 
-     // Add the next item in the list to the model otherwise set complete
+     // Add the next chunk of items in the list to the model
      function process()
      {
          if (i < list.length) {
-             console.log(JSON.stringify(list[i]));
+             var items = list.slice(i, i + chunkSize);
+
+             indexRows(items, i);
+
              processing++;
-             sendMessage({'add': list[i], 'model': model});
-             i++;
-         } else {
-             sync()
+             sentTime = Date.now();
+             span = Tracing.begin("appendChunk", {size: items.length});
+             Tracing.count("modelItems", items.length);
+             sendMessage({'add': items, 'model': model});
+             i += items.length;
          }
      }
 
-     function reset()
+     // Record the rows the items will be appended at, keeping the first row of duplicates
+     function indexRows(items, start)
      {
-         i = 0;
-         completed = false;
+         for (var j=0; j < items.length; j++) {
+             var key = items[j].filename !== undefined ? items[j].filename : items[j].file;
+
+             if (key !== undefined && !rowIndex.hasOwnProperty(key)) {
+                 rowIndex[key] = start + j;
+             }
+         }
      }
 
-     function sync()
+     function reset()
      {
-         processing++;
-         sendMessage({'sync': true, 'model': model});
+         i = 0;
+         completed = false;
      }
 }
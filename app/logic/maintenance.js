@@ -0,0 +1,103 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+.import "meta-database.js" as Library
+.import "playlists.js" as Playlists
+.import "storage.js" as Storage
+.import "tracing.js" as Tracing
+
+// Maintenance tasks of the app databases which are run at idle time by the
+// MaintenanceScheduler. Each task is a single statement or is bounded by
+// the budget so that it can be run between interactions, interval is the
+// minimum time in ms between two runs of the task and run(options) returns a
+// result for the trace. A task returning "partial" has more to do and is
+// run again in a later slice.
+
+var day = 24 * 3600 * 1000
+
+var tasks = [
+    {name: "pruneRecent", interval: 0, run: function(options) {
+        return Library.pruneRecent(options.recentSize);
+    }},
+    {name: "pruneOrphanedTracks", interval: day, run: function(options) {
+        return Playlists.pruneOrphanedTracks();
+    }},
+    {name: "analyzeMetadata", interval: 7 * day, run: function(options) {
+        Storage.analyze(Storage.metadata);
+    }},
+    {name: "analyzePlaylist", interval: 7 * day, run: function(options) {
+        Storage.analyze(Storage.playlist);
+    }},
+    {name: "vacuumMetadata", interval: 7 * day, run: function(options) {
+        return vacuum(Storage.metadata, options);
+    }},
+    {name: "vacuumPlaylist", interval: 7 * day, run: function(options) {
+        return vacuum(Storage.playlist, options);
+    }}
+]
+
+// Release the free pages of the database within the budget once enough of
+// it is free pages. Databases created before incremental vacuum mode was
+// enabled can only be converted by a VACUUM, which LocalStorage can't run
+function vacuum(name, options) {
+    var stats = Storage.pageStats(name);
+
+    if (!stats.incremental) {
+        return "unsupported";
+    } else if (stats.freePages < stats.pages * options.vacuumFreeRatio) {
+        return "skipped";
+    }
+
+    var released = Storage.incrementalVacuum(name, options.budget);
+
+    return released < stats.freePages ? "partial" : "vacuumed";
+}
+
+// Get the tasks which are due to run at now
+function dueTasks(now) {
+    var last = Library.getMaintenanceTimes();
+    var res = [];
+
+    for (var i=0; i < tasks.length; i++) {
+        if ((last[tasks[i].name] || 0) + tasks[i].interval <= now) {
+            res.push(tasks[i]);
+        }
+    }
+
+    return res;
+}
+
+// Run the task, a task which fails is still recorded as run so that it is
+// retried at its next interval instead of in every idle period, a task
+// which is only partly done is left due
+function runTask(task, options) {
+    var span = Tracing.begin(task.name);
+    var res;
+
+    try {
+        res = task.run(options);
+    } catch (e) {
+        console.warn("Maintenance task", task.name, "failed:", e);
+        res = "failed";
+    }
+
+    if (res !== "partial") {
+        Library.setMaintenanceTime(task.name, Date.now());
+    }
+    Tracing.end(span, {result: res});
+
+    return res;
+}
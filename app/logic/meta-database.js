@@ -17,38 +17,73 @@
  * along with this program.  If not, see <http://www.gnu.org/licenses/>.
  */
 
-// First, let's create a short helper function to get the database connection
-function getDatabase() {
-     return LocalStorage.openDatabaseSync("music-app-metadata", "1.0", "StorageDatabase", 1000000);
-}
+.import "storage.js" as Storage
+.import "tracing.js" as Tracing
 
 function createQueue(tx) {
     if (tx === undefined) {
-        var db = getDatabase();
-        db.transaction(
+        Storage.transaction(Storage.metadata,
             function(tx) {
                 createQueue(tx)
             }
         )
     } else {
-        tx.executeSql("CREATE TABLE IF NOT EXISTS queue(ind INTEGER NOT NULL, filename TEXT)");
+        var rs = tx.executeSql("SELECT sql FROM sqlite_master WHERE type='table' AND name='queue'");
+
+        if (rs.rows.length === 0) {
+            tx.executeSql("CREATE TABLE queue(ind INTEGER PRIMARY KEY, filename TEXT, shuffle REAL)");
+        } else if (rs.rows.item(0).sql.indexOf("PRIMARY KEY") === -1) {
+            // Migrate the old unindexed queue, keeping the order but making the indexes dense
+            console.debug("QUEUE migrating to indexed table");
+
+            tx.executeSql("CREATE TABLE queue_new(ind INTEGER PRIMARY KEY, filename TEXT, shuffle REAL)");
+            tx.executeSql("INSERT INTO queue_new (filename) SELECT filename FROM queue ORDER BY ind ASC");
+            tx.executeSql("DROP TABLE queue");
+            tx.executeSql("ALTER TABLE queue_new RENAME TO queue");
+
+            // rowids start at 1 so shift them down to start at 0
+            parkQueueRange(1, -1, -1, tx);
+            unparkQueue(tx);
+        } else if (rs.rows.item(0).sql.indexOf("shuffle") === -1) {
+            console.debug("QUEUE adding shuffle keys");
+
+            tx.executeSql("ALTER TABLE queue ADD COLUMN shuffle REAL");
+        }
+
+        // Give any item without a key a random place in the shuffle order
+        tx.executeSql("UPDATE queue SET shuffle=random() / 18446744073709551616.0 + 0.5 WHERE shuffle IS NULL");
+    }
+}
+
+// Shift the rows start..end (an end of -1 is the end of the queue) by offset.
+// The rows are parked at negative indexes until unparkQueue() is called
+// so that the primary key is never violated while shifting ranges
+function parkQueueRange(start, end, offset, tx) {
+    if (end === -1) {
+        tx.executeSql('UPDATE queue SET ind=-(ind+?)-1 WHERE ind>=?;',
+                      [offset, start])
+    } else {
+        tx.executeSql('UPDATE queue SET ind=-(ind+?)-1 WHERE ind>=? AND ind<=?;',
+                      [offset, start, end])
     }
 }
 
+// Move any parked rows back to their new positive indexes
+function unparkQueue(tx) {
+    tx.executeSql('UPDATE queue SET ind=-ind-1 WHERE ind<0;')
+}
+
 function clearQueue() {
-    var db = getDatabase();
-    db.transaction(
+    Storage.transaction(Storage.metadata,
         function(tx) {
-            createQueue();
             tx.executeSql('DELETE FROM queue');
       });
 }
 
 function addQueueItem(filename) {
-    var db = getDatabase();
     var res="";
 
-    db.transaction(function(tx) {
+    Storage.transaction(Storage.metadata, function(tx) {
         var ind = getNextIndex(tx);
 
         var rs = tx.executeSql('INSERT OR REPLACE INTO queue (ind, filename) VALUES (?,?);', [ind, filename]);
@@ -64,9 +99,7 @@ function addQueueItem(filename) {
 }
 
 function addQueueList(items) {
-    var db = getDatabase();
-
-    db.transaction(function(tx) {
+    Storage.transaction(Storage.metadata, function(tx) {
         var ind = getNextIndex(tx);
 
         for (var i = 0; i < items.length; i++) {
@@ -81,9 +114,7 @@ function getNextIndex(tx) {
     var ind;
 
     if (tx === undefined) {
-        var db = getDatabase();
-
-        db.transaction(function(tx) {
+        Storage.transaction(Storage.metadata, function(tx) {
             ind = getNextIndex(tx);
         });
     } else {
@@ -94,98 +125,219 @@ function getNextIndex(tx) {
     return ind;
 }
 
-function moveQueueItem(from, to) {
-    var db = getDatabase();
-    var res="";
-
-    db.transaction(function(tx) {
-        // Track to move put as -1 for now
-        tx.executeSql('UPDATE queue SET ind=? WHERE ind=?;',
-                      [-1, from])
+// Move the row from to the index to, shifting the rows inbetween by one
+function moveQueueItem(from, to, tx) {
+    if (from === to) {
+        return;
+    } else if (tx === undefined) {
+        Storage.transaction(Storage.metadata, function(tx) {
+            moveQueueItem(from, to, tx)
+        });
+    } else {
+        // Park the track to move at its new position
+        parkQueueRange(from, from, to - from, tx)
 
-        // Shuffle tracks inbetween from->to
+        // Shift the tracks inbetween from->to
         if (from > to) {
-            for (var i = from-1; i >= to; i--) {
-                tx.executeSql('UPDATE queue SET ind=? WHERE ind=?;',
-                              [i+1, i])
-            }
+            parkQueueRange(to, from - 1, 1, tx)
         } else {
-            for (var j = from+1; j <= to; j++) {
-                tx.executeSql('UPDATE queue SET ind=? WHERE ind=?;',
-                              [j-1, j])
-            }
+            parkQueueRange(from + 1, to, -1, tx)
         }
 
-        // Switch moving track to its new position
-        tx.executeSql('UPDATE queue SET ind=? WHERE ind=?;',
-                      [to, -1])
-
-    })
+        unparkQueue(tx)
+    }
 }
 
 
 // Optimised removeQueue for removing multiple tracks from the queue
-function removeQueueList(list)
+function removeQueueList(list, tx)
 {
-    var db = getDatabase()
     var i;
     var res = false
 
-    db.transaction(function (tx) {
-        // Remove all the deleted indexes
+    if (tx === undefined) {
+        Storage.transaction(Storage.metadata, function (tx) {
+            res = removeQueueList(list, tx)
+        })
+    } else if (list.length > 0) {
+        var ranges = [];
+        var removed = 0;
+
+        list = list.slice().sort(function(a, b) { return a - b; });
+
+        // Merge the indexes into ranges of start, end points
         for (i=0; i < list.length; i++) {
-            tx.executeSql('DELETE FROM queue WHERE ind=?;', [list[i]])
+            if (ranges.length > 0 && ranges[ranges.length - 1].end + 1 >= list[i]) {
+                ranges[ranges.length - 1].end = list[i];
+            } else {
+                ranges.push({start: list[i], end: list[i]});
+            }
         }
 
-        // Rebuild queue in order
-        var rs = tx.executeSql('SELECT ind FROM queue ORDER BY ind ASC')
+        // Remove each range and shift the gap after it by the number removed so far
+        for (i=0; i < ranges.length; i++) {
+            tx.executeSql('DELETE FROM queue WHERE ind>=? AND ind<=?;',
+                          [ranges[i].start, ranges[i].end])
 
-        for (i=0; i < rs.rows.length; i++) {
-            tx.executeSql('UPDATE queue SET ind=? WHERE ind=?;',
-                          [i, rs.rows.item(i).ind])
+            removed += ranges[i].end - ranges[i].start + 1;
+
+            parkQueueRange(ranges[i].end + 1,
+                           i + 1 < ranges.length ? ranges[i + 1].start - 1 : -1,
+                           -removed, tx)
         }
-    })
+
+        unparkQueue(tx)
+
+        res = true
+    }
 
     return res
 }
 
+// Insert items into the queue at start with their shuffle keys, shifting
+// the following rows down
+function insertQueueRange(start, items, keys, tx) {
+    if (tx === undefined) {
+        Storage.transaction(Storage.metadata, function(tx) {
+            insertQueueRange(start, items, keys, tx)
+        });
+    } else {
+        parkQueueRange(start, -1, items.length, tx)
+        unparkQueue(tx)
 
-function getQueue() {
-    var db = getDatabase();
-    var res = [];
-    db.transaction( function(tx) {
-        var rs = tx.executeSql("SELECT * FROM queue ORDER BY ind ASC");
-        for(var i = 0; i < rs.rows.length; i++) {
-            var filename = rs.rows.item(i).filename;
+        for (var i=0; i < items.length; i++) {
+            tx.executeSql('INSERT INTO queue (ind, filename, shuffle) VALUES (?,?,?);',
+                          [start + i, items[i], keys[i]])
+        }
+    }
+}
 
-            if (filename !== null) {
-                // ms2 doesn't expect the URI scheme so strip file://
-                if (filename.indexOf("file://") == 0) {
-                    filename = filename.substr(7);
-                }
+// Remove the rows start..end (inclusive) from the queue, shifting the following rows up
+function removeQueueRange(start, end, tx) {
+    if (tx === undefined) {
+        Storage.transaction(Storage.metadata, function(tx) {
+            removeQueueRange(start, end, tx)
+        });
+    } else {
+        tx.executeSql('DELETE FROM queue WHERE ind>=? AND ind<=?;',
+                      [start, end])
+
+        parkQueueRange(end + 1, -1, -(end - start + 1), tx)
+        unparkQueue(tx)
+    }
+}
 
-                if (musicStore.lookup(decodeFileURI(filename)) != null) {
-                    res.push(Qt.resolvedUrl(filename));
-                }
+// Replace the filenames of the rows from start onwards
+function changeQueueRange(start, items, tx) {
+    if (tx === undefined) {
+        Storage.transaction(Storage.metadata, function(tx) {
+            changeQueueRange(start, items, tx)
+        });
+    } else {
+        for (var i=0; i < items.length; i++) {
+            tx.executeSql('UPDATE queue SET filename=? WHERE ind=?;',
+                          [items[i], start + i])
+        }
+    }
+}
+
+// Apply a list of changes recorded from the play queue in one transaction
+// each change is {type: "insert"|"remove"|"change"|"move", start, end, items, keys}
+// where a move is of the row start to the index end and keys are the shuffle
+// keys of the inserted items
+function applyQueueChanges(changes) {
+    var span = Tracing.begin("applyQueueChanges", {changes: changes.length});
+
+    Storage.transaction(Storage.metadata, function(tx) {
+        for (var i=0; i < changes.length; i++) {
+            var change = changes[i];
+
+            if (change.type === "insert") {
+                insertQueueRange(change.start, change.items, change.keys, tx);
+            } else if (change.type === "remove") {
+                removeQueueRange(change.start, change.end, tx);
+            } else if (change.type === "change") {
+                changeQueueRange(change.start, change.items, tx);
+            } else if (change.type === "move") {
+                moveQueueItem(change.start, change.end, tx);
             }
+        }
+    });
 
+    Tracing.end(span);
+}
+
+
+// Get up to count rows of the queue from the index start and before the
+// index end (-1 for the end of the queue). Returns {items, keys, missing, last}
+// where items are the sources that exist in ms2, keys are their shuffle keys,
+// missing are the indexes of the rows that don't and last is the index of the
+// last row read (-1 if there were no rows). The queue is not modified so that it can be read in
+// chunks, the caller removes the missing rows once it has read them all
+function getQueueRange(start, end, count) {
+    var res = {items: [], keys: [], missing: [], last: -1};
+    var span = Tracing.begin("getQueueRange");
+
+    Storage.readTransaction(Storage.metadata, function(tx) {
+        var rs;
+
+        if (end === -1) {
+            rs = tx.executeSql("SELECT ind, filename, shuffle FROM queue WHERE ind>=? ORDER BY ind ASC LIMIT ?",
+                               [start, count]);
+        } else {
+            rs = tx.executeSql("SELECT ind, filename, shuffle FROM queue WHERE ind>=? AND ind<? ORDER BY ind ASC LIMIT ?",
+                               [start, end, count]);
+        }
+
+        var filenames = [];
+        var i;
+
+        for (i = 0; i < rs.rows.length; i++) {
+            filenames.push(rs.rows.item(i).filename || "");
+        }
+
+        var metas = trackCache.lookupBatch(filenames);
+
+        for (i = 0; i < rs.rows.length; i++) {
+            res.last = rs.rows.item(i).ind;
+
+            if (filenames[i] !== "" && metas[i] !== null) {
+                // ms2 doesn't expect the URI scheme so strip file://
+                res.items.push(Qt.resolvedUrl(filenames[i].indexOf("file://") === 0 ? filenames[i].substr(7) : filenames[i]));
+                res.keys.push(rs.rows.item(i).shuffle);
+            } else {
+                res.missing.push(rs.rows.item(i).ind);
+            }
         }
     });
+
+    Tracing.end(span, {count: res.items.length});
+
     return res;
 }
 
+// Replace the whole queue with the list of sources and their shuffle keys in
+// one transaction
+function replaceQueue(items, keys) {
+    Storage.transaction(Storage.metadata, function(tx) {
+        tx.executeSql('DELETE FROM queue');
+
+        for (var i = 0; i < items.length; i++) {
+            tx.executeSql('INSERT INTO queue (ind, filename, shuffle) VALUES (?,?,?);', [i, items[i], keys[i]]);
+        }
+    });
+}
+
 function isQueueEmpty(tx) {
     var empty = false;
 
     if (tx === undefined) {
-        var db = getDatabase();
         var res = 0;
 
-        db.transaction( function(tx) {
+        Storage.transaction(Storage.metadata,  function(tx) {
             empty = isQueueEmpty(tx)
         });
     } else {
-        createQueue(tx);
         var rs = tx.executeSql("SELECT count(*) as value FROM queue")
         empty = rs.rows.item(0).value === 0
     }
@@ -194,8 +346,7 @@ function isQueueEmpty(tx) {
 }
 
 function createRecent() {
-    var db = getDatabase();
-    db.transaction(
+    Storage.transaction(Storage.metadata,
         function(tx) {
             // Check of old version of db (or no db) then clear and rebuild if needed
             try {
@@ -206,26 +357,47 @@ function createRecent() {
                 // Data is either the playlist name or album name
                 tx.executeSql("CREATE TABLE IF NOT EXISTS recent(time DATETIME UNIQUE, data TEXT, type TEXT)");
             }
+
+            // Display metadata so the recent page needs no extra models, rows
+            // from before are filled in when the library is next scanned
+            try {
+                tx.executeSql("SELECT covers FROM recent");
+            } catch (e) {
+                tx.executeSql("ALTER TABLE recent ADD COLUMN author TEXT NOT NULL DEFAULT ''");
+                tx.executeSql("ALTER TABLE recent ADD COLUMN artist TEXT NOT NULL DEFAULT ''");
+                tx.executeSql("ALTER TABLE recent ADD COLUMN covers TEXT NOT NULL DEFAULT '[]'");
+            }
+
+            // Items are looked up and replaced by their type and data
+            tx.executeSql("CREATE INDEX IF NOT EXISTS recent_type_data ON recent(type, data)");
       });
 }
 
+// Remove all but the newest max recent items, returns the number removed
+function pruneRecent(max) {
+    return Storage.transaction(Storage.metadata, function(tx) {
+        return tx.executeSql("DELETE FROM recent WHERE time NOT IN (SELECT time FROM recent ORDER BY time DESC LIMIT ?)",
+                             [max]).rowsAffected;
+    });
+}
+
 function clearRecentHistory() {
-    var db = getDatabase();
-    db.transaction(
+    Storage.transaction(Storage.metadata,
         function(tx) {
             tx.executeSql('DELETE FROM recent');
       });
 }
 
 
-// This function is used to insert a recent item into the database
-function addRecent(data, type) {
-    var db = getDatabase();
+// This function is used to insert a recent item into the database, meta is
+// the display metadata of the item {author, artist, covers}
+function addRecent(data, type, meta) {
+    meta = meta || {};
 
     console.debug("RECENT", data, type);
 
 
-    db.transaction(function (tx) {
+    Storage.transaction(Storage.metadata, function (tx) {
         // Remove old albums/playlists with same name as they have a new time
         if (type === "album") {
             tx.executeSql("DELETE FROM recent WHERE type=? AND data=?", ["album", data])
@@ -233,7 +405,8 @@ function addRecent(data, type) {
             tx.executeSql("DELETE FROM recent WHERE type=? AND data=?", ["playlist", data])
         }
 
-        var rs = tx.executeSql('INSERT OR REPLACE INTO recent (time, data, type) VALUES (?, ?, ?)', [new Date(), data, type]);
+        var rs = tx.executeSql('INSERT OR REPLACE INTO recent (time, data, type, author, artist, covers) VALUES (?, ?, ?, ?, ?, ?)',
+                               [new Date(), data, type, meta.author || "", meta.artist || "", JSON.stringify(meta.covers || [])]);
 
         if (rs.rowsAffected <= 0) {
             console.debug("RECENT add Fail")
@@ -243,26 +416,37 @@ function addRecent(data, type) {
 
 function getRecent() {
     var res = [];
-    var db = getDatabase();
 
-    db.transaction( function(tx) {
+    Storage.transaction(Storage.metadata,  function(tx) {
         var rs = tx.executeSql("SELECT * FROM recent ORDER BY time DESC LIMIT 15");
         for(var i = 0; i < rs.rows.length; i++) {
             var dbItem = rs.rows.item(i);
 
             console.log("Time:", dbItem.time, ", Data:", dbItem.data, ", Type:", dbItem.type);
 
-            res.push({"time": dbItem.time, "data": dbItem.data, "type": dbItem.type});
+            res.push({"time": dbItem.time, "data": dbItem.data, "type": dbItem.type,
+                      "author": dbItem.author, "artist": dbItem.artist, "covers": dbItem.covers});
         }
     });
     return res;
 }
 
+// Update the display metadata of recent items, items is a list of
+// {data, type, author, artist, covers}
+function updateRecent(items) {
+    Storage.transaction(Storage.metadata, function(tx) {
+        for (var i=0; i < items.length; i++) {
+            tx.executeSql("UPDATE recent SET author=?, artist=?, covers=? WHERE type=? AND data=?",
+                          [items[i].author || "", items[i].artist || "", JSON.stringify(items[i].covers || []),
+                           items[i].type, items[i].data]);
+        }
+    });
+}
+
 function recentContainsPlaylist(key) {
-    var db = getDatabase();
     var rs;
 
-    db.transaction(function(tx) {
+    Storage.transaction(Storage.metadata, function(tx) {
         rs = tx.executeSql("SELECT count(*) as value FROM recent WHERE type=? AND data=?",
                            ["playlist", key]);
     });
@@ -273,9 +457,7 @@ function recentContainsPlaylist(key) {
 // Remove albums from recent by album
 function recentRemoveAlbums(albums)
 {
-    var db = getDatabase();
-
-    db.transaction( function(tx) {
+    Storage.transaction(Storage.metadata,  function(tx) {
         for (var i=0; i < albums.length; i++) {
             tx.executeSql("DELETE FROM recent WHERE type=? AND data=?",
                           ["album", albums[i]]);
@@ -285,9 +467,8 @@ function recentRemoveAlbums(albums)
 
 function recentRemovePlaylist(key) {
     var res = false
-    var db = getDatabase();
 
-    db.transaction( function(tx) {
+    Storage.transaction(Storage.metadata,  function(tx) {
         res = tx.executeSql("DELETE FROM recent WHERE type=? AND data=?",
                             ["playlist", key]).rowsAffected > 0;
 
@@ -297,9 +478,7 @@ function recentRemovePlaylist(key) {
 }
 
 function recentRenamePlaylist(oldKey, newKey) {
-    var db = getDatabase();
-
-    db.transaction( function(tx) {
+    Storage.transaction(Storage.metadata,  function(tx) {
         tx.executeSql("UPDATE recent SET data=? WHERE type=? AND data=?",
                       [newKey, "playlist", oldKey]);
 
@@ -307,10 +486,9 @@ function recentRenamePlaylist(oldKey, newKey) {
 }
 
 function isRecentEmpty() {
-    var db = getDatabase();
     var res = 0;
 
-    db.transaction(function(tx) {
+    Storage.transaction(Storage.metadata, function(tx) {
         var rs;
 
         try {
@@ -329,3 +507,31 @@ function isRecentEmpty() {
 
     return res === 0;
 }
+
+function createMaintenance() {
+    Storage.transaction(Storage.metadata, function(tx) {
+        // Time (ms since the epoch) each maintenance task was last run
+        tx.executeSql("CREATE TABLE IF NOT EXISTS maintenance(name TEXT PRIMARY KEY, time INTEGER NOT NULL)");
+    });
+}
+
+// Get the time each maintenance task was last run as {name: time}
+function getMaintenanceTimes() {
+    var res = {};
+
+    Storage.readTransaction(Storage.metadata, function(tx) {
+        var rs = tx.executeSql("SELECT name, time FROM maintenance");
+
+        for (var i=0; i < rs.rows.length; i++) {
+            res[rs.rows.item(i).name] = rs.rows.item(i).time;
+        }
+    });
+
+    return res;
+}
+
+function setMaintenanceTime(name, time) {
+    Storage.transaction(Storage.metadata, function(tx) {
+        tx.executeSql("INSERT OR REPLACE INTO maintenance (name, time) VALUES (?, ?)", [name, time]);
+    });
+}
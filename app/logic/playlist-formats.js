@@ -0,0 +1,245 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+.pragma library
+
+// Incremental parsing and writing of M3U and XSPF playlists. A parser is
+// created over the text of the playlist and its entries are taken from it
+// in batches with nextEntries() so that large playlists can be parsed across
+// event loop ticks. Durations are in seconds.
+
+var playlistExtensions = /\.(m3u8?|xspf)$/i
+
+// Check if the path or URL is of a playlist file that can be imported
+function isPlaylistFile(path) {
+    return playlistExtensions.test(path.toString())
+}
+
+function isXspf(path, text) {
+    return /\.xspf$/i.test(path) ||
+            (text.lastIndexOf("<?xml", 0) === 0 && text.indexOf("<playlist") !== -1)
+}
+
+// Get the name of the playlist from the filename without its extension
+function nameFromPath(path) {
+    var name = path.split("/").pop()
+    var dot = name.lastIndexOf(".")
+
+    return dot > 0 ? name.substring(0, dot) : name
+}
+
+function decode(text) {
+    try {
+        return decodeURIComponent(text)
+    } catch (e) {
+        return text
+    }
+}
+
+function escapeXml(text) {
+    return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;")
+            .replace(/>/g, "&gt;").replace(/"/g, "&quot;")
+}
+
+function unescapeXml(text) {
+    return text.replace(/&lt;/g, "<").replace(/&gt;/g, ">").replace(/&quot;/g, "\"")
+            .replace(/&apos;/g, "'").replace(/&amp;/g, "&")
+}
+
+// Resolve the location of an entry to an absolute filename, relative
+// locations are relative to the directory of the playlist. Returns "" for
+// locations which can't be in the library (eg http://)
+function resolveLocation(location, base, uri) {
+    if (location.lastIndexOf("file://", 0) === 0) {
+        location = decode(location.substring(7))
+
+        // file://localhost/path
+        if (location.charAt(0) !== "/") {
+            location = location.substring(location.indexOf("/"))
+        }
+    } else if (/^[a-z][a-z0-9+.-]*:/i.test(location)) {
+        return ""
+    } else if (uri) {
+        location = decode(location)
+    }
+
+    location = location.replace(/\\/g, "/")
+
+    if (location.charAt(0) !== "/") {
+        location = base + "/" + location
+    }
+
+    // Remove any . and .. segments
+    var parts = location.split("/")
+    var res = []
+
+    for (var i=0; i < parts.length; i++) {
+        if (parts[i] === "..") {
+            res.pop()
+        } else if (parts[i] !== "." && (parts[i] !== "" || i === 0)) {
+            res.push(parts[i])
+        }
+    }
+
+    return res.join("/")
+}
+
+function tagValue(text, tag) {
+    var match = new RegExp("<" + tag + "\\b[^>]*>([\\s\\S]*?)</" + tag + ">").exec(text)
+
+    return match !== null ? unescapeXml(match[1].trim()) : ""
+}
+
+// Create a parser of the text of the playlist at path
+function createParser(text, path) {
+    var xspf = isXspf(path, text)
+
+    return {
+        base: path.substring(0, path.lastIndexOf("/")),
+        done: text.length === 0,
+        info: null,  // #EXTINF of the next M3U entry
+        offset: 0,
+        text: text,
+        title: xspf ? tagValue(text.substring(0, text.search(/<trackList\b|$/)), "title") : "",
+        xspf: xspf,
+    }
+}
+
+// Fraction of the playlist which has been parsed
+function progress(parser) {
+    return parser.done ? 1 : parser.offset / parser.text.length
+}
+
+// Get up to count more entries {filename, title, duration} from the parser
+function nextEntries(parser, count) {
+    var entries = []
+
+    while (!parser.done && entries.length < count) {
+        var entry = parser.xspf ? nextXspfEntry(parser) : nextM3uEntry(parser)
+
+        if (entry !== null && entry.filename !== "") {
+            entries.push(entry)
+        }
+    }
+
+    return entries
+}
+
+function nextM3uEntry(parser) {
+    var end = parser.text.indexOf("\n", parser.offset)
+
+    if (end === -1) {
+        end = parser.text.length
+    }
+
+    var line = parser.text.substring(parser.offset, end).trim()
+
+    parser.offset = end + 1
+    parser.done = parser.offset >= parser.text.length
+
+    if (line.lastIndexOf("#EXTINF:", 0) === 0) {
+        var comma = line.indexOf(",")
+
+        parser.info = {
+            duration: parseInt(line.substring(8, comma === -1 ? line.length : comma)) || 0,
+            title: comma === -1 ? "" : line.substring(comma + 1).trim()
+        }
+
+        return null
+    } else if (line === "" || line.charAt(0) === "#") {
+        return null
+    }
+
+    var info = parser.info || {duration: 0, title: ""}
+
+    parser.info = null
+
+    return {
+        filename: resolveLocation(line.replace(/^\uFEFF/, ""), parser.base, false),
+        title: info.title,
+        duration: Math.max(info.duration, 0)
+    }
+}
+
+function nextXspfEntry(parser) {
+    var pattern = /<track\b[^>]*>([\s\S]*?)<\/track>/g
+
+    pattern.lastIndex = parser.offset
+
+    var match = pattern.exec(parser.text)
+
+    if (match === null) {
+        parser.offset = parser.text.length
+        parser.done = true
+
+        return null
+    }
+
+    parser.offset = pattern.lastIndex
+    parser.done = parser.offset >= parser.text.length
+
+    return {
+        filename: resolveLocation(tagValue(match[1], "location"), parser.base, true),
+        title: tagValue(match[1], "title"),
+        duration: Math.round((parseInt(tagValue(match[1], "duration")) || 0) / 1000)
+    }
+}
+
+function fileUri(filename) {
+    return "file://" + filename.split("/").map(encodeURIComponent).join("/")
+}
+
+// Get the text before, for the tracks {filename, title, author, album,
+// duration} and after the entries of a playlist in the format of path
+function header(path, title) {
+    if (isXspf(path, "")) {
+        return "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n" +
+                "<playlist version=\"1\" xmlns=\"http://xspf.org/ns/0/\">\n" +
+                "  <title>" + escapeXml(title) + "</title>\n" +
+                "  <trackList>\n"
+    } else {
+        return "#EXTM3U\n"
+    }
+}
+
+function entries(path, tracks) {
+    var res = []
+    var xspf = isXspf(path, "")
+
+    for (var i=0; i < tracks.length; i++) {
+        var track = tracks[i]
+
+        if (xspf) {
+            res.push("    <track>\n" +
+                     "      <location>" + escapeXml(fileUri(track.filename)) + "</location>\n" +
+                     "      <title>" + escapeXml(track.title) + "</title>\n" +
+                     "      <creator>" + escapeXml(track.author) + "</creator>\n" +
+                     "      <album>" + escapeXml(track.album) + "</album>\n" +
+                     "      <duration>" + Math.round(track.duration * 1000) + "</duration>\n" +
+                     "    </track>\n")
+        } else {
+            res.push("#EXTINF:" + Math.round(track.duration) + "," +
+                     (track.author ? track.author + " - " : "") + track.title + "\n" +
+                     track.filename + "\n")
+        }
+    }
+
+    return res.join("")
+}
+
+function footer(path) {
+    return isXspf(path, "") ? "  </trackList>\n</playlist>\n" : ""
+}
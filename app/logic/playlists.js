@@ -17,19 +17,29 @@
  * along with this program.  If not, see <http://www.gnu.org/licenses/>.
  */
 
+.import "storage.js" as Storage
+.import "tracing.js" as Tracing
+
+// Gap between the sort keys (track.i) of tracks, so that a track can be
+// moved between two others without renumbering the rest of the playlist
+var trackKeyStep = 1048576
+
+// Number of unique covers cached for each playlist
+var playlistCoverCount = 4
+
 // LEGACY Helper for the playlists database
 function getPlaylistsDatabase() {
-    return LocalStorage.openDatabaseSync("music-app-playlists", "1.0",
-                                         "StorageDatabase", 1000000)
+    return Storage.database(Storage.legacyPlaylists)
 }
 
 // CURRENT database for individual playlists - the one witht the actual tracks in
 function getPlaylistDatabase() {
-    return LocalStorage.openDatabaseSync("music-app-playlist", "",
-                                         "StorageDatabase", 1000000)
+    return Storage.database(Storage.playlist)
 }
 
-// same thing for individal playlists
+// same thing for individal playlists, returns the playlists read from the
+// legacy database which are added by restorePlaylists(). Each step checks
+// the version of the database so running this again is harmless
 function initializePlaylist() {
     var db = getPlaylistDatabase()
     console.debug("Playlist DB is version " + db.version)
@@ -105,7 +115,64 @@ function initializePlaylist() {
     db.transaction(function (tx) {
         tx.executeSql('CREATE TABLE IF NOT EXISTS playlist(name TEXT PRIMARY KEY, FOREIGN KEY (name) REFERENCES track(playlist));')
         tx.executeSql('CREATE TABLE IF NOT EXISTS track(i INTEGER NOT NULL, playlist TEXT NOT NULL, filename TEXT, title TEXT, author TEXT, album TEXT, PRIMARY KEY (playlist, i), FOREIGN KEY (playlist) REFERENCES tracks(playlist));')
+    })
+
+    // Spread out the dense indexes of existing tracks into sort keys
+    if (db.version === "1.3") {
+        db.changeVersion(db.version, "1.4", function (tx) {
+            console.debug("DB: Changing version of playlist db to 1.4, spreading track indexes")
+
+            // Go via negative keys so the primary key is never violated
+            tx.executeSql('UPDATE track SET i=-((i + 1) * ?)-1;', [trackKeyStep])
+            tx.executeSql('UPDATE track SET i=-i-1 WHERE i < 0;')
+        })
+    }
+
+    // Store the duration of tracks and keep a summary of each playlist
+    if (db.version === "1.4") {
+        db.changeVersion(db.version, "1.5", function (tx) {
+            console.debug("DB: Changing version of playlist db to 1.5, adding playlist summaries")
 
+            tx.executeSql('ALTER TABLE track ADD COLUMN duration INTEGER;')
+
+            var rs = tx.executeSql('SELECT playlist, i, filename FROM track;')
+
+            for (var i=0; i < rs.rows.length; i++) {
+                tx.executeSql('UPDATE track SET duration=? WHERE playlist=? AND i=?;',
+                              [getTrackDuration(rs.rows.item(i)), rs.rows.item(i).playlist, rs.rows.item(i).i])
+            }
+
+            tx.executeSql('CREATE TABLE playlist_summary(name TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0, duration INTEGER NOT NULL DEFAULT 0);')
+            tx.executeSql('INSERT INTO playlist_summary (name, count, duration) SELECT playlist.name, COUNT(track.i), IFNULL(SUM(track.duration), 0) FROM playlist LEFT JOIN track ON track.playlist=playlist.name GROUP BY playlist.name;')
+        })
+    }
+
+    // Cache the covers of each playlist in the summary
+    if (db.version === "1.5") {
+        db.changeVersion(db.version, "1.6", function (tx) {
+            console.debug("DB: Changing version of playlist db to 1.6, adding playlist covers")
+
+            // NULL covers are generated on the next read
+            tx.executeSql('ALTER TABLE playlist_summary ADD COLUMN covers TEXT;')
+        })
+    }
+
+    // Index the filenames of tracks so removed files can be found
+    if (db.version === "1.6") {
+        db.changeVersion(db.version, "1.7", function (tx) {
+            console.debug("DB: Changing version of playlist db to 1.7, indexing track filenames")
+
+            tx.executeSql('CREATE INDEX IF NOT EXISTS track_filename_idx ON track(filename);')
+        })
+    }
+
+    return playlists
+}
+
+// Add the playlists migrated from the legacy database, this looks up every
+// track so it is deferred until after startup
+function restorePlaylists(playlists) {
+    Storage.transaction(Storage.playlist, function (tx) {
         console.debug("DB: Restore", JSON.stringify(playlists))
 
         // Restore old db data if exists
@@ -121,16 +188,29 @@ function initializePlaylist() {
             }
         }
     })
+}
 
+// Lookup the mediascanner2 metadata of a track filename
+function lookupTrack(filename) {
+    return trackCache.lookup(filename)
+}
+
+// Get the duration of a track model, looking it up if the model doesn't have it
+function getTrackDuration(model) {
+    if (model.duration !== undefined && model.duration !== null) {
+        return model.duration
+    }
+
+    var meta = model.filename ? lookupTrack(model.filename) : null
+
+    return meta !== null ? meta.duration : 0
 }
 
 function addPlaylist(name, tx) {
     var rs = false;
 
     if (tx === undefined) {
-        var db = getPlaylistDatabase()
-
-        db.transaction(function (tx) {
+        Storage.transaction(Storage.playlist, function (tx) {
             rs = addPlaylist(name, tx)
         });
     }
@@ -143,6 +223,11 @@ function addPlaylist(name, tx) {
         } catch (e) {
             rs = false
         }
+
+        if (rs) {
+            tx.executeSql('INSERT OR REPLACE INTO playlist_summary (name, count, duration) VALUES (?, 0, 0);',
+                          [name])
+        }
     }
 
     return rs;
@@ -152,24 +237,12 @@ function addToPlaylist(playlist, model, tx) {
     var rs = false
 
     if (tx === undefined) {
-        var db = getPlaylistDatabase()
-
-        db.transaction(function (tx) {
+        Storage.transaction(Storage.playlist, function (tx) {
             rs = addToPlaylist(playlist, model, tx)
         });
     }
     else {
-        // Generate new index number if records exist, otherwise use 0
-        rs = tx.executeSql('SELECT MAX(i) FROM track WHERE playlist=?;',
-                           playlist)
-
-        var index = isNaN(rs.rows.item(0)["MAX(i)"]) ? 0 : rs.rows.item(
-                                                           0)["MAX(i)"] + 1
-
-        // Add track to db
-        rs = tx.executeSql(
-                    'INSERT OR REPLACE INTO track VALUES (?,?,?,?,?,?);',
-                    [index, playlist, model.filename, model.title, model.author, model.album]).rowsAffected > 0
+        rs = insertTracks(playlist, [model], tx) > 0
     }
 
     return rs
@@ -179,112 +252,246 @@ function addToPlaylist(playlist, model, tx) {
 function addToPlaylistList(playlist, items, tx)
 {
     if (tx === undefined) {
-        var db = getPlaylistDatabase()
-
-        db.transaction(function (tx) {
+        Storage.transaction(Storage.playlist, function (tx) {
             addToPlaylistList(playlist, items, tx)
         });
     }
     else {
-        for (var i=0; i < items.length; i++) {
-            addToPlaylist(playlist, items[i], tx)
-            console.debug("Debug: " + items[i].filename + " added to " + playlist)
+        insertTracks(playlist, items, tx)
+        console.debug("Debug:", items.length, "tracks added to", playlist)
+    }
+}
+
+// Append the tracks to the end of the playlist and update its summary,
+// returns the number of tracks added
+function insertTracks(playlist, items, tx) {
+    var added = 0
+    var duration = 0
+
+    // Generate new sort key after the last track if records exist, otherwise use the first step
+    var rs = tx.executeSql('SELECT IFNULL(MAX(i), 0) AS max FROM track WHERE playlist=?;',
+                           [playlist])
+
+    var index = rs.rows.item(0).max + trackKeyStep
+
+    for (var j=0; j < items.length; j++) {
+        var model = items[j]
+        var trackDuration = getTrackDuration(model)
+
+        // Add track to db
+        if (tx.executeSql(
+                    'INSERT OR REPLACE INTO track (i, playlist, filename, title, author, album, duration) VALUES (?,?,?,?,?,?,?);',
+                    [index, playlist, model.filename, model.title, model.author, model.album, trackDuration]).rowsAffected > 0) {
+            added++
+            duration += trackDuration
+            index += trackKeyStep
         }
     }
+
+    updatePlaylistSummary(playlist, added, duration, tx)
+
+    if (added > 0) {
+        invalidatePlaylistCovers(playlist, tx)
+    }
+
+    return added
+}
+
+// Adjust the count and duration of the summary of a playlist
+function updatePlaylistSummary(playlist, count, duration, tx) {
+    if (count !== 0 || duration !== 0) {
+        tx.executeSql('UPDATE playlist_summary SET count=count + ?, duration=duration + ? WHERE name=?;',
+                      [count, duration, playlist])
+    }
 }
 
 function getPlaylists() {
-    // returns playlists with count and 4 covers
-    var db = getPlaylistDatabase()
+    // returns playlists with count, total duration and covers (as JSON)
     var res = []
+    var span = Tracing.begin("getPlaylists")
 
     try {
-        db.transaction(function (tx) {
-            var rs = tx.executeSql('SELECT * FROM playlist ORDER BY name COLLATE NOCASE;')
+        Storage.transaction(Storage.playlist, function (tx) {
+            var rs = tx.executeSql("SELECT playlist.name AS name, IFNULL(playlist_summary.count, 0) AS count, IFNULL(playlist_summary.duration, 0) AS duration, IFNULL(playlist_summary.covers, '') AS covers FROM playlist LEFT JOIN playlist_summary ON playlist_summary.name=playlist.name ORDER BY playlist.name COLLATE NOCASE;")
 
             for (var i = 0; i < rs.rows.length; i++) {
                 var dbItem = rs.rows.item(i)
 
                 res.push({
                              name: dbItem.name,
-                             count: getPlaylistCount(dbItem.name, tx)
+                             count: dbItem.count,
+                             duration: dbItem.duration,
+                             covers: dbItem.covers !== "" ? dbItem.covers : getPlaylistCoversJSON(dbItem.name, tx)
                          })
             }
         })
     } catch (e) {
-        return []
+        res = []
     }
 
+    Tracing.end(span, {count: res.length})
+
     return res
 }
 
+// Get the tracks of the playlist which exist in mediascanner2, this does not
+// modify the playlist, missing tracks are removed by the LibraryChangesHelper
 function getPlaylistTracks(playlist) {
-    var db = getPlaylistDatabase()
-    var j
     var res = []
-
-    var erroneousTracks = [];
+    var span = Tracing.begin("getPlaylistTracks")
 
     try {
-        db.transaction(function (tx) {
-            var rs = tx.executeSql('SELECT * FROM track WHERE playlist=?;',
+        Storage.readTransaction(Storage.playlist, function (tx) {
+            var rs = tx.executeSql('SELECT * FROM track WHERE playlist=? ORDER BY i ASC;',
                                    [playlist])
-            for (j = 0; j < rs.rows.length; j++) {
+
+            for (var j = 0; j < rs.rows.length; j++) {
                 var dbItem = rs.rows.item(j)
+                var meta = lookupTrack(dbItem.filename)
 
-                // ms2 doesn't expect the URI scheme so strip file://
-                if (dbItem.filename.indexOf("file://") === 0) {
-                    dbItem.filename = dbItem.filename.substr(7);
-                }
+                if (meta !== null) {
+                    // ms2 doesn't expect the URI scheme so strip file://
+                    if (dbItem.filename.indexOf("file://") === 0) {
+                        dbItem.filename = dbItem.filename.substr(7);
+                    }
 
-                if (musicStore.lookup(decodeFileURI(dbItem.filename)) === null) {
-                    erroneousTracks.push(dbItem.i);
-                } else {
                     res.push({
                                  i: dbItem.i,
                                  filename: dbItem.filename,
                                  title: dbItem.title,
                                  author: dbItem.author,
                                  album: dbItem.album,
-                                 art: musicStore.lookup(decodeFileURI(dbItem.filename)).art
+                                 art: meta.art
                              })
                 }
             }
-
-            // remove bad tracks
-            for (j=0; j < erroneousTracks.length; j++) {
-                console.debug("Remove", erroneousTracks[j], "from playlist", playlist);
-                tx.executeSql('DELETE FROM track WHERE playlist=? AND i=?;',
-                              [playlist, erroneousTracks[j]])
-            }
-
-            reorder(playlist, "remove", tx)
         })
     } catch (e) {
-        return []
+        res = []
     }
 
-    if (erroneousTracks.length > 0) {  // reget data as indexes are out of sync
-        res = getPlaylistTracks(playlist)
-    }
+    Tracing.end(span, {count: res.length})
 
     return res
 }
 
+// Get up to count stored tracks of the playlist after the sort key after,
+// used to read large playlists in batches (start with an after of 0)
+function getPlaylistTrackRange(playlist, after, count) {
+    var res = []
+
+    Storage.readTransaction(Storage.playlist, function (tx) {
+        var rs = tx.executeSql('SELECT i, filename, title, author, album, duration FROM track WHERE playlist=? AND i>? ORDER BY i ASC LIMIT ?;',
+                               [playlist, after, count])
+
+        for (var j = 0; j < rs.rows.length; j++) {
+            var dbItem = rs.rows.item(j)
+
+            // ms2 doesn't expect the URI scheme so strip file://
+            if (dbItem.filename.indexOf("file://") === 0) {
+                dbItem.filename = dbItem.filename.substr(7)
+            }
+
+            res.push({
+                         i: dbItem.i,
+                         filename: dbItem.filename,
+                         title: dbItem.title,
+                         author: dbItem.author,
+                         album: dbItem.album,
+                         duration: dbItem.duration || 0
+                     })
+        }
+    })
+
+    return res
+}
+
+// Get up to count of the distinct filenames of the tracks in all the
+// playlists which sort after the filename after, in order
+function getTrackFilenames(after, count) {
+    var res = []
+
+    Storage.readTransaction(Storage.playlist, function (tx) {
+        var rs = tx.executeSql('SELECT DISTINCT filename FROM track WHERE filename > ? ORDER BY filename ASC LIMIT ?;',
+                               [after, count])
+
+        for (var j = 0; j < rs.rows.length; j++) {
+            res.push(rs.rows.item(j).filename)
+        }
+    })
+
+    return res
+}
+
+// Remove the tracks with the filenames given from all the playlists in one
+// transaction, returns the names of the playlists that were changed
+function removeMissingFiles(filenames) {
+    var changed = []
+
+    Storage.transaction(Storage.playlist, function (tx) {
+        var missing = {}
+        var playlist
+
+        // Tracks may have been stored with or without the URI scheme, and
+        // keep below the limit of variables in a statement
+        for (var start = 0; start < filenames.length; start += 400) {
+            var params = []
+            var placeholders = []
+
+            for (var j = start; j < filenames.length && j < start + 400; j++) {
+                params.push(filenames[j], "file://" + filenames[j])
+                placeholders.push("?, ?")
+            }
+
+            var rs = tx.executeSql('SELECT playlist, i FROM track WHERE filename IN (' + placeholders.join(", ") + ');',
+                                   params)
+
+            for (j = 0; j < rs.rows.length; j++) {
+                if (missing[rs.rows.item(j).playlist] === undefined) {
+                    missing[rs.rows.item(j).playlist] = []
+                }
+
+                missing[rs.rows.item(j).playlist].push(rs.rows.item(j).i)
+            }
+        }
+
+        for (playlist in missing) {
+            console.debug("Remove", JSON.stringify(missing[playlist]), "from playlist", playlist)
+
+            deleteTracks(playlist, missing[playlist], tx)
+            changed.push(playlist)
+        }
+    })
+
+    return changed
+}
+
+// Remove the tracks and summaries left behind by playlists which no longer
+// exist, returns the number of tracks removed
+function pruneOrphanedTracks() {
+    return Storage.transaction(Storage.playlist, function (tx) {
+        var removed = tx.executeSql('DELETE FROM track WHERE playlist NOT IN (SELECT name FROM playlist);').rowsAffected
+
+        tx.executeSql('DELETE FROM playlist_summary WHERE name NOT IN (SELECT name FROM playlist);')
+
+        return removed
+    })
+}
+
 function getPlaylistCount(playlist, tx) {
     var rs = 0;
 
     if (tx === undefined) {
-        var db = getPlaylistDatabase()
-
-        db.transaction(function (tx) {
+        Storage.transaction(Storage.playlist, function (tx) {
             rs = getPlaylistCount(playlist, tx)
         });
     }
     else {
         try {
-            rs = tx.executeSql('SELECT * FROM track WHERE playlist=?;',
-                                [playlist]).rows.length
+            var res = tx.executeSql('SELECT count FROM playlist_summary WHERE name=?;',
+                                    [playlist])
+
+            rs = res.rows.length > 0 ? res.rows.item(0).count : 0
         } catch (e) {
             return rs
         }
@@ -293,61 +500,83 @@ function getPlaylistCount(playlist, tx) {
     return rs
 }
 
-function getPlaylistCovers(playlist, max) {
-    var db = getPlaylistDatabase()
+// Get a list of unique covers for the playlist, these are cached in the
+// playlist summary until the tracks of the playlist change
+function getPlaylistCovers(playlist, max, tx) {
     var res = []
 
-    // Get a list of unique covers for the playlist
-    try {
-        db.transaction(function (tx) {
-            var rs = tx.executeSql("SELECT * FROM track WHERE playlist=?;",
-                                   [playlist])
+    if (tx === undefined) {
+        try {
+            Storage.transaction(Storage.playlist, function (tx) {
+                res = getPlaylistCovers(playlist, max, tx)
+            })
+        } catch (e) {
+            return []
+        }
+    }
+    else {
+        res = JSON.parse(getPlaylistCoversJSON(playlist, tx))
+    }
 
-            for (var i = 0; i < rs.rows.length
-                 && i < (max || rs.rows.length); i++) {
-                if (musicStore.lookup(decodeFileURI(rs.rows.item(i).filename)) !== null) {
-                    var row = {
-                        author: rs.rows.item(i).author,
-                        album: rs.rows.item(i).album,
-                        art: musicStore.lookup(decodeFileURI(rs.rows.item(i).filename)).art
-                    }
+    return max ? res.slice(0, max) : res
+}
 
-                    if (find(res, row) === null) {
-                        res.push(row)
-                    }
-                }
-            }
-        })
-    } catch (e) {
-        return []
+// Get the cached covers of the playlist as JSON, generating them if needed
+function getPlaylistCoversJSON(playlist, tx) {
+    var rs = tx.executeSql("SELECT IFNULL(covers, '') AS covers FROM playlist_summary WHERE name=?;",
+                           [playlist])
+
+    if (rs.rows.length > 0 && rs.rows.item(0).covers !== "") {
+        return rs.rows.item(0).covers
     }
 
-    return res
-}
+    var covers = []
 
-function find(arraytosearch, object) {
+    // Unique author/album pairs in the order they first appear, with a
+    // few spare in case some of the tracks no longer exist
+    rs = tx.executeSql("SELECT author, album, filename, MIN(i) AS first FROM track WHERE playlist=? GROUP BY author, album ORDER BY first ASC LIMIT ?;",
+                       [playlist, playlistCoverCount * 4])
 
-    for (var i = 0; i < arraytosearch.length; i++) {
+    for (var i = 0; i < rs.rows.length && covers.length < playlistCoverCount; i++) {
+        var meta = lookupTrack(rs.rows.item(i).filename)
 
-        if (arraytosearch[i]["author"] == object["author"] &&
-            arraytosearch[i]["album"] == object["album"]) {
-            return i;
+        if (meta !== null) {
+            covers.push({
+                            author: rs.rows.item(i).author,
+                            album: rs.rows.item(i).album,
+                            art: meta.art
+                        })
         }
     }
-    return null;
+
+    covers = JSON.stringify(covers)
+
+    tx.executeSql('UPDATE playlist_summary SET covers=? WHERE name=?;',
+                  [covers, playlist])
+
+    return covers
+}
+
+// Clear the cached covers of the playlist as its tracks have changed
+function invalidatePlaylistCovers(playlist, tx) {
+    tx.executeSql('UPDATE playlist_summary SET covers=NULL WHERE name=?;',
+                  [playlist])
 }
 
 function renamePlaylist(from, to) {
     var res = false;
 
     if (from !== to) {
-        var db = getPlaylistDatabase()
-
-        db.transaction(function (tx) {
+        Storage.transaction(Storage.playlist, function (tx) {
             if (addPlaylist(to, tx) === true) {
                 tx.executeSql('UPDATE track SET playlist=? WHERE playlist=?;',
                               [to, from])
 
+                // Carry the summary over to the new name
+                tx.executeSql('DELETE FROM playlist_summary WHERE name=?;', [to])
+                tx.executeSql('UPDATE playlist_summary SET name=? WHERE name=?;',
+                              [to, from])
+
                 removePlaylist(from, tx)
 
                 res = true
@@ -361,86 +590,134 @@ function renamePlaylist(from, to) {
     return res;
 }
 
-function removePlaylist(playlist) {
-    var db = getPlaylistDatabase()
+function removePlaylist(playlist, tx) {
     var res = false
 
-    db.transaction(function (tx) {
+    if (tx === undefined) {
+        Storage.transaction(Storage.playlist, function (tx) {
+            res = removePlaylist(playlist, tx)
+        });
+    }
+    else {
         tx.executeSql('DELETE FROM track WHERE playlist=?;', [playlist])
+        tx.executeSql('DELETE FROM playlist_summary WHERE name=?;', [playlist])
         res = tx.executeSql('DELETE FROM playlist WHERE name=?;',
                             [playlist]).rowsAffected > 0
-    })
+    }
 
     return res
 }
 
+// Remove the tracks with the sort keys (track.i) given from the playlist
 function removeFromPlaylist(playlist, indexes) {
-    var db = getPlaylistDatabase()
+    Storage.transaction(Storage.playlist, function (tx) {
+        deleteTracks(playlist, indexes, tx)
+    })
+}
 
-    db.transaction(function (tx) {
-        for (var i = 0; i < indexes.length; i++) {
+// Delete the tracks with the sort keys given and update the playlist summary
+function deleteTracks(playlist, indexes, tx) {
+    var count = 0
+    var duration = 0
+
+    for (var i = 0; i < indexes.length; i++) {
+        var rs = tx.executeSql('SELECT IFNULL(duration, 0) AS duration FROM track WHERE playlist=? AND i=?;',
+                               [playlist, indexes[i]])
+
+        if (rs.rows.length > 0) {
             tx.executeSql('DELETE FROM track WHERE playlist=? AND i=?;',
-                          [playlist, indexes[i]]).rowsAffected > 0
+                          [playlist, indexes[i]])
+
+            count++
+            duration += rs.rows.item(0).duration
         }
+    }
 
-        reorder(playlist, "remove", tx)
-    })
-}
+    updatePlaylistSummary(playlist, -count, -duration, tx)
 
-function reorder(playlist, type, tx) {
-    var db = getPlaylistDatabase()
+    if (count > 0) {
+        invalidatePlaylistCovers(playlist, tx)
+    }
+}
 
+// Respace the sort keys of the playlist evenly, this is only needed
+// once the gap between two tracks has run out
+function compactPlaylist(playlist, tx) {
     if (tx === undefined) {
-        db.transaction(function (tx) {
-            reorder(playlist, type, tx)
+        Storage.transaction(Storage.playlist, function (tx) {
+            compactPlaylist(playlist, tx)
         });
     }
     else {
-        var res = tx.executeSql(
-                    "SELECT * FROM track WHERE i > ? AND playlist=? ORDER BY i ASC;",
-                    [-1, playlist])
-        var i;
-
-        if (type === "remove") {
-            for (i = 0; i < res.rows.length; i++) {
-                tx.executeSql('UPDATE track SET i=? WHERE i=? AND playlist=?;',
-                              [i, res.rows.item(i).i, playlist])
-            }
-        }
-        else {  // insert -1 at {type}, shuffle >= {type} + 1 and put -1 in the gap
-            for (i=res.rows.item(res.rows.length - 1).i; i >= type; i--) {
-                tx.executeSql('UPDATE track SET i=i + 1 WHERE i >= ? AND playlist=?;',
-                              [i, playlist])
-            }
+        console.debug("Compacting playlist", playlist)
+
+        // Number the keys in order, the rowids of the temporary table are
+        // assigned in the order the keys are inserted
+        tx.executeSql('CREATE TEMP TABLE IF NOT EXISTS track_position(pos INTEGER PRIMARY KEY, i INTEGER UNIQUE);')
+        tx.executeSql('DELETE FROM track_position;')
+        tx.executeSql('INSERT INTO track_position (i) SELECT i FROM track WHERE playlist=? AND i >= 0 ORDER BY i ASC;',
+                      [playlist])
+
+        // Go via negative keys so the primary key is never violated
+        tx.executeSql('UPDATE track SET i=-((SELECT pos FROM track_position WHERE track_position.i=track.i) * ?)-2 WHERE playlist=? AND i >= 0;',
+                      [trackKeyStep, playlist])
+        tx.executeSql('UPDATE track SET i=-i-2 WHERE playlist=? AND i < -1;',
+                      [playlist])
+
+        tx.executeSql('DELETE FROM track_position;')
+    }
+}
+
+// Get a sort key for a track inserted at position in the playlist
+function getPositionKey(playlist, position, tx) {
+    var rs = tx.executeSql('SELECT i FROM track WHERE playlist=? AND i >= 0 ORDER BY i ASC LIMIT ? OFFSET ?;',
+                           [playlist, position > 0 ? 2 : 1, position > 0 ? position - 1 : 0])
+    var low = -1
+    var high = null
 
-            tx.executeSql('UPDATE track SET i=? WHERE i=? AND playlist=?;',
-                          [type, -1, playlist])
+    if (position > 0 && rs.rows.length > 0) {
+        low = rs.rows.item(0).i
+
+        if (rs.rows.length > 1) {
+            high = rs.rows.item(1).i
         }
+    } else if (position === 0 && rs.rows.length > 0) {
+        high = rs.rows.item(0).i
+    }
+
+    if (high === null) {  // at the end of the playlist
+        return low === -1 ? trackKeyStep : low + trackKeyStep
+    } else if (high - low >= 2) {  // there is a gap between the neighbours
+        return Math.floor((low + high) / 2)
+    } else {
+        compactPlaylist(playlist, tx)
+
+        return getPositionKey(playlist, position, tx)
     }
 }
 
 function move(playlist, from, to) {
-    var db = getPlaylistDatabase()
-
     console.debug("Move", playlist, from, to)
 
-    db.transaction(function (tx) {
+    Storage.transaction(Storage.playlist, function (tx) {
         // Hide track from list
+        tx.executeSql('UPDATE track SET i=? WHERE playlist=? AND i=(SELECT i FROM track WHERE playlist=? ORDER BY i ASC LIMIT 1 OFFSET ?);',
+                      [-1, playlist, playlist, from])
+
+        // Give the track a key between its new neighbours
         tx.executeSql('UPDATE track SET i=? WHERE i=? AND playlist=?;',
-                      [-1, from, playlist])
+                      [getPositionKey(playlist, to, tx), -1, playlist])
 
-        reorder(playlist, "remove", tx) // 'remove' resorting the queue
-        reorder(playlist, to, tx) // insert the track in the new position
+        invalidatePlaylistCovers(playlist, tx)
     })
 
 }
 
 function reset() {
-    var db = getPlaylistDatabase()
-
-    db.transaction(function (tx) {
+    Storage.transaction(Storage.playlist, function (tx) {
         tx.executeSql('DROP TABLE IF EXISTS playlist;')
         tx.executeSql('DROP TABLE IF EXISTS track;')
+        tx.executeSql('DELETE FROM playlist_summary;')
     })
 
     console.debug("Playlists deleted!")
@@ -0,0 +1,102 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+.import "meta-database.js" as Library
+.import "playlists.js" as Playlists
+.import "storage.js" as Storage
+.import "tracing.js" as Tracing
+
+// Versions of each part of the schema across the metadata and playlist
+// databases. When a migration is added to the upgrade of a part bump its
+// version so that the upgrade runs on the next start. An upgrade may return
+// a function of non critical work to run after startup.
+var parts = [
+    {name: "queue", version: 2, upgrade: Library.createQueue},
+    {name: "recent", version: 3, upgrade: Library.createRecent},
+    {name: "maintenance", version: 1, upgrade: Library.createMaintenance},
+    {name: "playlist", version: 7, upgrade: upgradePlaylists},  // playlist db is "1.<version>"
+]
+
+function upgradePlaylists() {
+    var playlists = Playlists.initializePlaylist();
+
+    if (Object.keys(playlists).length === 0) {
+        return null;
+    }
+
+    return function() {
+        Playlists.restorePlaylists(playlists);
+    }
+}
+
+// Bring every part of the schema up to date, when everything is current this
+// is a single read. Returns the deferred functions of the upgrades that ran
+function bootstrap() {
+    var current = {};
+    var deferred = [];
+    var upgraded = 0;
+    var span = Tracing.begin("schemaBootstrap");
+
+    Storage.readTransaction(Storage.metadata, function(tx) {
+        try {
+            var rs = tx.executeSql("SELECT name, version FROM schema_version");
+
+            for (var i=0; i < rs.rows.length; i++) {
+                current[rs.rows.item(i).name] = rs.rows.item(i).version;
+            }
+        } catch (e) {
+            console.debug("No schema versions, creating the schema");
+        }
+    });
+
+    for (var i=0; i < parts.length; i++) {
+        var part = parts[i];
+        var from = current[part.name] || 0;
+
+        if (from === part.version) {
+            continue;
+        }
+
+        console.debug("Upgrading schema of", part.name, "from", from, "to", part.version);
+
+        // The upgrade and its version are committed together, except for
+        // the playlist part whose steps are committed to the playlist
+        // database by changeVersion(). Those steps are guarded by the
+        // version of that database so the upgrade can run again if its
+        // version here was not written
+        var result = Storage.unitOfWork([Storage.metadata], function() {
+            var res = part.upgrade();
+
+            Storage.transaction(Storage.metadata, function(tx) {
+                tx.executeSql("CREATE TABLE IF NOT EXISTS schema_version(name TEXT PRIMARY KEY, version INTEGER NOT NULL)");
+                tx.executeSql("INSERT OR REPLACE INTO schema_version (name, version) VALUES (?, ?)",
+                              [part.name, part.version]);
+            });
+
+            return res;
+        });
+
+        upgraded++;
+
+        if (typeof result === "function") {
+            deferred.push(result);
+        }
+    }
+
+    Tracing.end(span, {upgraded: upgraded});
+
+    return deferred;
+}
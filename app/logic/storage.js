@@ -0,0 +1,153 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+.pragma library
+.import QtQuick.LocalStorage 2.0 as Sql
+
+// Storage layer shared by every importer of this library. Database handles
+// are opened once and kept, and the steps of one user action can be grouped
+// into a unit of work with unitOfWork() so that they are committed together
+// in a single transaction of each database instead of one per step.
+
+// Names of the databases
+var metadata = "music-app-metadata"
+var playlist = "music-app-playlist"
+var legacyPlaylists = "music-app-playlists"
+
+var versions = {}
+versions[metadata] = "1.0"
+versions[playlist] = ""  // versioned by the playlist upgrades
+versions[legacyPlaylists] = "1.0"
+
+var handles = {}  // name -> open database
+var units = {}  // name -> transaction of the current unit of work
+
+// Get the open handle of the database, opening it the first time
+function database(name) {
+    if (handles[name] === undefined) {
+        handles[name] = Sql.LocalStorage.openDatabaseSync(name, versions[name], "StorageDatabase", 1000000)
+
+        // Free pages can only be released in steps by incrementalVacuum()
+        // in this mode, it only applies to databases created from here on
+        handles[name].transaction(function (tx) {
+            tx.executeSql("PRAGMA auto_vacuum=INCREMENTAL")
+        })
+    }
+
+    return handles[name]
+}
+
+// Run func(tx) in a transaction of the database, or in the transaction of
+// the unit of work when one is open for it. Returns the result of func
+function transaction(name, func) {
+    if (units[name] !== undefined) {
+        return func(units[name])
+    }
+
+    var res
+
+    database(name).transaction(function (tx) {
+        res = func(tx)
+    })
+
+    return res
+}
+
+// Run func(tx) in a read only transaction of the database, or in the
+// transaction of the unit of work when one is open for it
+function readTransaction(name, func) {
+    if (units[name] !== undefined) {
+        return func(units[name])
+    }
+
+    var res
+
+    database(name).readTransaction(function (tx) {
+        res = func(tx)
+    })
+
+    return res
+}
+
+// Run func() with one transaction open on each of the databases named so
+// that everything it stores is committed once when it returns, or rolled
+// back if it throws. Units of work can be nested
+function unitOfWork(names, func) {
+    if (names.length === 0) {
+        return func()
+    }
+
+    var name = names[0]
+
+    if (units[name] !== undefined) {  // already part of an outer unit
+        return unitOfWork(names.slice(1), func)
+    }
+
+    var res
+
+    database(name).transaction(function (tx) {
+        units[name] = tx
+
+        try {
+            res = unitOfWork(names.slice(1), func)
+        } finally {
+            delete units[name]
+        }
+    })
+
+    return res
+}
+
+// Update the statistics used by the query planner of the database
+function analyze(name) {
+    transaction(name, function (tx) {
+        tx.executeSql("ANALYZE")
+    })
+}
+
+// Get the number of pages, free pages, the page size of the database and
+// whether it is in incremental vacuum mode, read only transactions of
+// LocalStorage only accept SELECT statements
+function pageStats(name) {
+    return transaction(name, function (tx) {
+        return {
+            pages: tx.executeSql("PRAGMA page_count").rows.item(0).page_count,
+            freePages: tx.executeSql("PRAGMA freelist_count").rows.item(0).freelist_count,
+            pageSize: tx.executeSql("PRAGMA page_size").rows.item(0).page_size,
+            incremental: tx.executeSql("PRAGMA auto_vacuum").rows.item(0).auto_vacuum === 2
+        }
+    })
+}
+
+// Release free pages of the database, which must be in incremental vacuum
+// mode, until there are none left or budget ms have passed. VACUUM can't be
+// used as it can't run in the transaction LocalStorage runs statements in.
+// Returns the number of pages released
+function incrementalVacuum(name, budget) {
+    return transaction(name, function (tx) {
+        var start = Date.now()
+        var free = tx.executeSql("PRAGMA freelist_count").rows.item(0).freelist_count
+        var released = 0
+
+        // each statement releases one page as LocalStorage only steps it once
+        while (released < free && Date.now() - start < budget) {
+            tx.executeSql("PRAGMA incremental_vacuum(1)")
+            released++
+        }
+
+        return released
+    })
+}
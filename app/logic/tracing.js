@@ -0,0 +1,112 @@
+/*
+ * Copyright (C) 2016 Canonical Ltd
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; version 3.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+.pragma library
+
+// Lightweight tracing of spans and counters, dumped as a Chrome trace
+// (load the file in chrome://tracing). Everything returns early when
+// tracing is not enabled so calls can be left in hot paths.
+
+var enabled = false
+var events = []
+var maxEvents = 200000  // stop recording rather than grow forever
+var dropped = 0
+var counters = {}
+var outputFile = ""
+var origin = 0
+
+function enable(file) {
+    enabled = true
+    outputFile = file
+    origin = Date.now()
+    events = []
+    dropped = 0
+    counters = {}
+
+    console.debug("Tracing enabled, writing to " + file)
+}
+
+function record(event) {
+    if (events.length < maxEvents) {
+        event.pid = 1
+        event.tid = 1
+        events.push(event)
+    } else {
+        dropped++
+    }
+}
+
+// Start a span, pass the returned token to end(), which is null when disabled
+function begin(name, args) {
+    if (!enabled) {
+        return null
+    }
+
+    return {name: name, start: Date.now(), args: args}
+}
+
+function end(span, args) {
+    if (span === null || span === undefined) {
+        return
+    }
+
+    record({name: span.name, cat: "music", ph: "X",
+            ts: (span.start - origin) * 1000,
+            dur: (Date.now() - span.start) * 1000,
+            args: args !== undefined ? args : span.args})
+}
+
+// Record a single point in time, such as a log message
+function instant(name, args) {
+    if (!enabled) {
+        return
+    }
+
+    record({name: name, cat: "music", ph: "i", s: "g",
+            ts: (Date.now() - origin) * 1000, args: args})
+}
+
+// Add delta to the counter name and record its new value
+function count(name, delta) {
+    if (!enabled) {
+        return
+    }
+
+    counters[name] = (counters[name] || 0) + (delta === undefined ? 1 : delta)
+
+    record({name: name, cat: "music", ph: "C",
+            ts: (Date.now() - origin) * 1000, args: {value: counters[name]}})
+}
+
+// Write the trace so far to the output file
+function dump() {
+    if (!enabled) {
+        return
+    }
+
+    var trace = JSON.stringify({traceEvents: events,
+                                otherData: {dropped: dropped, counters: counters}})
+    var request = new XMLHttpRequest()
+
+    request.open("PUT", outputFile.indexOf("file://") === 0 ? outputFile : "file://" + outputFile, false)
+
+    try {
+        request.send(trace)
+        console.debug("Trace written to " + outputFile + ", " + events.length + " events")
+    } catch (err) {
+        console.debug("Unable to write trace to " + outputFile + ": " + err)
+    }
+}
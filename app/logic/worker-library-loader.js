@@ -21,13 +21,10 @@
 WorkerScript.onMessage = function(msg) {
     if (msg.clear === true) {
         msg.model.clear();
-        msg.model.sync();
-        WorkerScript.sendMessage({});
-    } else if (msg.sync === true) {
-        msg.model.sync();   // updates the changes to the list
-        WorkerScript.sendMessage({"sync": true});
     } else {
-        msg.model.append(msg.add);
-        WorkerScript.sendMessage({});
+        msg.model.append(msg.add);  // add is an array of items
     }
+
+    msg.model.sync();   // updates the changes to the list
+    WorkerScript.sendMessage({});
 }
@@ -18,6 +18,7 @@
  */
 
 import QtQuick 2.4
+import QtQuick.Window 2.2
 import Ubuntu.Components 1.3
 import Ubuntu.Components.Popups 1.3
 import Ubuntu.MediaScanner 0.1
@@ -28,6 +29,8 @@ import QtGraphicalEffects 1.0
 import "logic/stored-request.js" as StoredRequest
 import "logic/meta-database.js" as Library
 import "logic/playlists.js" as Playlists
+import "logic/schema.js" as Schema
+import "logic/tracing.js" as Tracing
 import "components"
 import "components/Helpers"
 import "ui"
@@ -56,14 +59,36 @@ MainView {
         }
     }
 
+    // Set trace=true in the DeveloperSettings group of the app config to
+    // write a trace to trace.json in the app cache, as launchers such as
+    // click can't pass --trace
+    Settings {
+        id: developerSettings
+        category: "DeveloperSettings"
+
+        property bool trace: false
+    }
+
     Connections {  // save the current queueIndex for when the app restarts
         target: player.mediaPlayer.playlist
-        onCurrentIndexChanged: startupSettings.queueIndex = player.mediaPlayer.playlist.currentIndex
+        // the index only matches the database once the queue is restored
+        onCurrentIndexChanged: {
+            if (!player.mediaPlayer.playlist.restoring) {
+                startupSettings.queueIndex = player.mediaPlayer.playlist.currentIndex
+            }
+        }
+        onRestoringChanged: {
+            if (!player.mediaPlayer.playlist.restoring) {
+                startupSettings.queueIndex = player.mediaPlayer.playlist.currentIndex
+            }
+        }
     }
 
     // Global keyboard shortcuts
     focus: true
     Keys.onPressed: {
+        maintenanceScheduler.postpone()
+
         if(event.key === Qt.Key_Escape) {
             if (mainPageStack.currentMusicPage.currentDialog !== null) {
                 PopupUtils.close(mainPageStack.currentMusicPage.currentDialog)
@@ -151,6 +176,20 @@ MainView {
             help: "Start Music in a debug mode. Will show more output."
             required: false
         }
+        // Directory to save the rendered blurred backgrounds in
+        Argument {
+            name: "cache-dir"
+            help: "Directory to cache rendered images in instead of the app cache, it must exist."
+            required: false
+            valueNames: ["dir"]
+        }
+        // Write a trace of startup and hot paths
+        Argument {
+            name: "trace"
+            help: "Write a Chrome trace of the app to the file when it exits."
+            required: false
+            valueNames: ["file"]
+        }
     }
 
     Action {
@@ -214,13 +253,33 @@ MainView {
 
     // Run on startup
     Component.onCompleted: {
+        if (args.values.trace) {
+            Tracing.enable(args.values.trace)
+        } else if (developerSettings.trace && appCacheDir !== "") {
+            Tracing.enable(appCacheDir + "/trace.json")
+        }
+
+        var startupSpan = Tracing.begin("startup")
+
         customdebug("Version "+appVersion) // print the curren version
 
-        Library.createRecent()  // initialize recent
-        Library.createQueue()  // create queue if it doesn't exist
+        // create or upgrade the recent, queue and playlist tables, anything
+        // the upgrades don't need immediately is run after startup
+        var deferred = Schema.bootstrap()
+
+        for (var i=0; i < deferred.length; i++) {
+            startupScheduler.defer("schemaUpgrade", deferred[i])
+        }
+
+        if (deferred.length > 0) {  // upgrades may have restored playlists
+            startupScheduler.defer("refreshPlaylists", function() {
+                if (tabs.selectedTab == playlistsTab) {
+                    playlistModel.filterPlaylists()
+                }
+            })
+        }
 
-        // initialize playlists
-        Playlists.initializePlaylist()
+        var span
 
         if (!args.values.url) {
             // load the previous queue as there are no args
@@ -230,34 +289,42 @@ MainView {
             // player.mediaPlayer.playlist.load("/home/phablet/.local/share/com.ubuntu.music/queue.m3u")
             // use onloaded() and onLoadFailed() to confirm it is complete
 
+            span = Tracing.begin("restoreQueue")
+
             if (!Library.isQueueEmpty()) {
                 console.debug("*** Restoring library queue");
-                player.mediaPlayer.playlist.addItems(Library.getQueue());
-
-                player.mediaPlayer.playlist.setCurrentIndex(queueIndex);
+                player.mediaPlayer.playlist.restoreQueue(queueIndex);
                 player.mediaPlayer.playlist.setPendingCurrentState(MediaPlayer.PausedState);
             }
             else {
                 console.debug("Queue is empty, not loading any recent tracks");
             }
+
+            Tracing.end(span, {count: player.mediaPlayer.playlist.itemCount})
         }
 
         // everything else
         loading.visible = true
 
         // push the page to view
+        span = Tracing.begin("pushTabs")
         mainPageStack.push(tabs)
+        Tracing.end(span)
 
         // if a tab index exists restore it, otherwise goto Recent if there are items otherwise go to Albums
+        span = Tracing.begin("restoreTab")
         tabs.selectedTabIndex = startupSettings.tabIndex === -1
-                ? (Library.isRecentEmpty() ? albumsTab.index : 0)
+                ? (startupRecentEmpty ? albumsTab.index : 0)
                 : (startupSettings.tabIndex > tabs.count - 1
                    ? tabs.count - 1 : startupSettings.tabIndex)
+        Tracing.end(span)
 
         loadedUI = true;
 
         // Run post load
+        span = Tracing.begin("ensurePopulated")
         tabs.ensurePopulated(tabs.selectedTab);
+        Tracing.end(span)
 
         // Display walkthrough on first run, even if the user has music
         if (firstRun) {
@@ -267,8 +334,59 @@ MainView {
         if (args.values.url) {
             uriHandler.process(args.values.url, true);
         }
+
+        // look for tracks removed from the library once the first frame is shown
+        startupScheduler.defer("libraryChanges", function() {
+            libraryChanges.active = true
+        })
+
+        // tidy the databases once the app is idle
+        startupScheduler.defer("maintenance", function() {
+            maintenanceScheduler.active = true
+        })
+        startupScheduler.start()
+
+        Tracing.end(startupSpan)
+    }
+
+    StartupScheduler {
+        id: startupScheduler
+    }
+
+    MaintenanceScheduler {
+        id: maintenanceScheduler
+    }
+
+    Connections {  // maintenance waits while the user moves around the app
+        target: mainPageStack
+        onCurrentPageChanged: maintenanceScheduler.postpone()
+    }
+
+    Connections {
+        target: tabs
+        onSelectedTabChanged: maintenanceScheduler.postpone()
+    }
+
+    Connections {  // includes media keys and other clients controlling playback
+        target: player.mediaPlayer
+        onPlaybackStateChanged: maintenanceScheduler.postpone()
+    }
+
+    // dialogs and text fields taking focus
+    Window.onActiveFocusItemChanged: maintenanceScheduler.postpone()
+
+    // Write the trace when the app is suspended or closed, as it may not be resumed
+    Connections {
+        target: Qt.application
+        onStateChanged: {
+            if (Qt.application.state !== Qt.ApplicationActive) {
+                Tracing.dump()
+            }
+        }
     }
 
+    Component.onDestruction: Tracing.dump()
+
     // VARIABLES
     property string musicName: i18n.tr("Music")
     property string appVersion: '2.5'
@@ -284,9 +402,32 @@ MainView {
 
     property bool wideAspect: width >= units.gu(95) && loadedUI
     property bool loadedUI: false  // property to detect if the UI has finished
+    // cache directory of the app, Qt creates it for its cache of compiled QML
+    readonly property string appCacheDir: standardCacheDir()
+
+    // Store the startup state of the db separately otherwise
+    // it breaks the binding of the recent tab model
+    property bool startupRecentEmpty: Library.isRecentEmpty()
 
     // FUNCTIONS
 
+    // Get the cache directory of the app, "" when it can't be found
+    function standardCacheDir() {
+        try {
+            // Qt.labs.platform is only needed here so don't require it at startup
+            var paths = Qt.createQmlObject("import QtQuick 2.4; import Qt.labs.platform 1.0; QtObject { readonly property url cache: StandardPaths.writableLocation(StandardPaths.CacheLocation) }",
+                                           mainView, "standardCacheDir")
+            var dir = paths.cache.toString()
+
+            paths.destroy()
+
+            return dir.indexOf("file://") === 0 ? decodeFileURI(dir.substring(7)) : ""
+        } catch (e) {
+            console.debug("Unable to find the cache directory:", e)
+            return ""
+        }
+    }
+
     onEmptyStateChanged: {
         if (emptyState) {
             emptyPage = mainPageStack.push(Qt.resolvedUrl("ui/LibraryEmptyState.qml"), {})
@@ -295,8 +436,11 @@ MainView {
         }
     }
 
-    // Custom debug funtion that's easier to shut off
+    // Custom debug funtion that's easier to shut off, the text is also
+    // recorded in the trace when tracing
     function customdebug(text) {
+        Tracing.instant(text)
+
         var debug = true; // set to "0" for not debugging
         //if (args.values.debug) { // *USE LATER*
         if (debug) {
@@ -327,6 +471,26 @@ MainView {
         };
     }
 
+    // Display metadata stored with a recent album, from its first track
+    function recentAlbumMeta(file) {
+        return {author: file.author, artist: file.albumArtist, covers: [makeDict(file)]};
+    }
+
+    // Display metadata stored with a recent playlist
+    function recentPlaylistMeta(playlist) {
+        return {covers: Playlists.getPlaylistCovers(playlist)};
+    }
+
+    // Refresh the covers stored with a recent playlist after its tracks changed
+    function refreshRecentPlaylist(playlist) {
+        var meta = recentPlaylistMeta(playlist);
+
+        meta.data = playlist;
+        meta.type = "playlist";
+
+        Library.updateRecent([meta]);
+    }
+
     // Clear the queue, queue this model and play the specific index
     function trackClicked(model, index, play) {
         // TODO: remove once playlists uses U1DB
@@ -334,13 +498,12 @@ MainView {
             model = model.linkLibraryListModel;
         }
 
-        var file = Qt.resolvedUrl(model.get(index, model.RoleModelData).filename);
-
         play = play === undefined ? true : play  // default play to true
 
         player.mediaPlayer.playlist.clearWrapper();  // clear the old model
-        player.mediaPlayer.playlist.setCurrentIndex(index);
-        player.mediaPlayer.playlist.addItemsFromModel(model);
+
+        // Queue the tracks around index first and stream in the rest
+        player.mediaPlayer.playlist.enqueueFromModel(model, index, true);
 
         if (play) {
             // Set the pending state for the playlist
@@ -373,12 +536,10 @@ MainView {
         }
 
         player.mediaPlayer.playlist.clearWrapper();
-        player.mediaPlayer.playlist.addItemsFromModel(model);
         player.shuffle = true;
 
-        // Once the model count has been reached in the queue
-        // shuffle the model
-        player.mediaPlayer.playlist.setPendingShuffle(model.count);
+        // Play the first track of a new shuffle order as soon as it is queued
+        player.mediaPlayer.playlist.addShuffledItemsFromModel(model);
 
         tabs.pushNowPlaying();
     }
@@ -411,85 +572,47 @@ MainView {
             id: allSongsModelModel
             objectName: "allSongsModelModel"
             store: musicStore
-
-            // if any tracks are removed from ms2 then check they are not in the queue
-            onFilled: {
-                var i
-                var removed = []
-
-                // Find tracks from the queue that aren't in ms2 anymore
-                for (i=0; i < player.mediaPlayer.playlist.count; i++) {
-                    var file = decodeFileURI(player.mediaPlayer.playlist.itemSource(i));
-
-                    // ms2 doesn't expect the URI scheme so strip file://
-                    if (file.indexOf("file://") === 0) {
-                        file = file.substr(7);
-                    }
-
-                    if (musicStore.lookup(file) === null) {
-                        removed.push(i)
-                    }
-                }
-
-                // If there are removed tracks then remove them from the queue and store
-                if (removed.length > 0) {
-                    console.debug("Removed queue:", JSON.stringify(removed))
-                    player.mediaPlayer.playlist.removeItemsWrapper(removed.slice());
-                }
-
-                // Loop through playlists, getPlaylistTracks will remove any tracks that don't exist
-                var playlists = Playlists.getPlaylists()
-
-                for (i=0; i < playlists.length; i++) {
-                    Playlists.getPlaylistTracks(playlists[i].name)
-                }
-
-                // TODO: improve in refactoring to be able detect when a track is removed
-                // Update playlists page
-                if (tabs.selectedTab == playlistsTab) {
-                    playlistModel.filterPlaylists()
-                }
-            }
         }
         sort.property: "title"
         sort.order: Qt.AscendingOrder
         sortCaseSensitivity: Qt.CaseInsensitive
     }
 
-    AlbumsModel {
-        id: allAlbumsModel
-        store: musicStore
-        // if any tracks are removed from ms2 then check they are not in recent
-        onFilled: {
-            var albums = []
-            var i
-            var removed = []
+    // blurred backgrounds of album art rendered once for each size
+    BlurCache {
+        id: blurCache
+        cacheDir: args.values["cache-dir"] || appCacheDir
+    }
 
-            for (i=0; i < allAlbumsModel.count; i++) {
-                albums.push(allAlbumsModel.get(i, allAlbumsModel.RoleTitle))
-            }
+    // metadata of tracks shared by the player, queue and logic
+    TrackCache {
+        id: trackCache
+        model: allSongsModelModel
+    }
 
-            // Find albums from recent that aren't in ms2 anymore
-            var recent = Library.getRecent()
+    LibrarySummaryHelper {
+        id: librarySummary
+        model: allSongsModelModel
+    }
 
-            for (i=0; i < recent.length; i++) {
-                if (recent[i].type === "album" && albums.indexOf(recent[i].data) === -1) {
-                    removed.push(recent[i].data)
-                }
-            }
+    PlaylistTransferHelper {
+        id: playlistTransfer
+        onFinished: playlistModel.filterPlaylists()
+    }
 
-            // If there are removed tracks then remove them from recent
-            if (removed.length > 0) {
-                console.debug("Removed recent:", JSON.stringify(removed))
-                Library.recentRemoveAlbums(removed)
+    // if any tracks are removed from ms2 then remove them from the queue, playlists and recent
+    LibraryChangesHelper {
+        id: libraryChanges
+        active: false  // activated by the startupScheduler
+        model: allSongsModelModel
 
-                if (recentPage.visible) {
-                    recentModel.filterRecent()
-                } else {
-                    recentPage.changed = true
-                }
+        onPlaylistsChanged: {
+            // Update playlists page
+            if (tabs.selectedTab == playlistsTab) {
+                playlistModel.filterPlaylists()
             }
         }
+        onRecentChanged: recentModel.filterRecent()
     }
 
     SongsModel {
@@ -502,7 +625,9 @@ MainView {
                     trackClicked(songsAlbumArtistModel, 0, true);
 
                     // Add album to recent list
-                    Library.addRecent(songsAlbumArtistModel.get(0, SongsModel.RoleModelData).album, "album")
+                    var file = songsAlbumArtistModel.get(0, SongsModel.RoleModelData);
+
+                    Library.addRecent(file.album, "album", recentAlbumMeta(file))
                     recentModel.filterRecent()
                 } else if (selectedAlbum) {
                     console.debug("Unknown artist-album " + artist + "/" + album + ", skipping")
@@ -553,7 +678,6 @@ MainView {
     // create the listmodel to use for playlists
     LibraryListModel {
         id: playlistModel
-        syncFactor: 1
 
         onPreLoadCompleteChanged: {
             if (preLoadComplete)
@@ -730,10 +854,6 @@ MainView {
                     }
                 }
 
-                // Store the startup state of the db separately otherwise
-                // it breaks the binding of model
-                property bool startupRecentEmpty: Library.isRecentEmpty()
-
                 // cached values of the recent model that are copied when
                 // the tab is created
                 property bool loading: false
@@ -22,6 +22,7 @@ import Ubuntu.Components 1.3
 import QtQuick.LocalStorage 2.0
 import "../logic/meta-database.js" as Library
 import "../logic/playlists.js" as Playlists
+import "../logic/storage.js" as Storage
 import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
@@ -93,7 +94,7 @@ MusicPage {
         objectName: "addToPlaylistGridView"
         delegate: Card {
             id: playlist
-            coverSources: Playlists.getPlaylistCovers(playlist.name)
+            coverSources: JSON.parse(model.covers)
             objectName: "addToPlaylistCardItem" + index
             property string name: model.name
             property string count: model.count
@@ -102,27 +103,32 @@ MusicPage {
             secondaryText: i18n.tr("%1 track", "%1 tracks", playlist.count).arg(playlist.count)
 
             onClicked: {
-                Playlists.addToPlaylistList(name, chosenElements)
+                // add the tracks and refresh recent in one commit
+                Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                    Playlists.addToPlaylistList(name, chosenElements)
 
-                if (tabs.selectedTab.title === i18n.tr("Playlists")) {
-                    // If we are on a page above playlists then set changed
-                    tabs.selectedTab.page.changed = true;
-                    tabs.selectedTab.page.childrenChanged = true;
-                } else {
-                    // Otherwise just reload the playlists
-                    playlistModel.filterPlaylists();
-                }
-
-                if (Library.recentContainsPlaylist(name)) {
-                    if (tabs.selectedTab.title === i18n.tr("Recent")) {
-                        // If we are on a page above recent then set changed
+                    if (tabs.selectedTab.title === i18n.tr("Playlists")) {
+                        // If we are on a page above playlists then set changed
                         tabs.selectedTab.page.changed = true;
                         tabs.selectedTab.page.childrenChanged = true;
                     } else {
-                        // Otherwise just reload recent
-                        recentModel.filterRecent();
+                        // Otherwise just reload the playlists
+                        playlistModel.filterPlaylists();
+                    }
+
+                    if (Library.recentContainsPlaylist(name)) {
+                        refreshRecentPlaylist(name);
+
+                        if (tabs.selectedTab.title === i18n.tr("Recent")) {
+                            // If we are on a page above recent then set changed
+                            tabs.selectedTab.page.changed = true;
+                            tabs.selectedTab.page.childrenChanged = true;
+                        } else {
+                            // Otherwise just reload recent
+                            recentModel.filterRecent();
+                        }
                     }
-                }
+                })
 
                 mainPageStack.goBack();  // go back to the previous page
             }
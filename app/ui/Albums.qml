@@ -24,6 +24,7 @@ import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
 import "../components/HeadState"
+import "../components/Helpers"
 
 
 MusicPage {
@@ -31,7 +32,7 @@ MusicPage {
     objectName: "albumsPage"
     title: i18n.tr("Albums")
     searchable: true
-    searchResultsCount: albumsModelFilter.count
+    searchResultsCount: searching ? (musicSearch.pending ? 1 : musicSearch.albums.count) : albumsModelFilter.count
     state: "default"
     states: [
         SearchableHeadState {
@@ -49,25 +50,38 @@ MusicPage {
     // qml doesn't optimise using the parent type
     property bool bug1341671workaround: true
 
+    // show the results of the full text search once there is a query
+    property bool searching: state === "search" && searchHeader.query !== ""
+
+    Connections {
+        target: searchHeader
+        onQueryChanged: musicSearch.search(searchHeader.query)
+    }
+
+    // full text search of ms2, each page has its own so that the query of
+    // one page doesn't filter the others
+    SearchHelper {
+        id: musicSearch
+    }
+
+    SortFilterModel {
+        id: albumsModelFilter
+        property alias rowCount: albumsModel.rowCount
+        model: AlbumsModel {
+            id: albumsModel
+            store: musicStore
+        }
+        sort.property: "title"
+        sort.order: Qt.AscendingOrder
+        sortCaseSensitivity: Qt.CaseInsensitive
+    }
+
     MusicGridView {
         id: albumGridView
         itemWidth: units.gu(15)
         heightOffset: units.gu(9.5)
 
-        model: SortFilterModel {
-            id: albumsModelFilter
-            property alias rowCount: albumsModel.rowCount
-            model: AlbumsModel {
-                id: albumsModel
-                store: musicStore
-            }
-            sort.property: "title"
-            sort.order: Qt.AscendingOrder
-            sortCaseSensitivity: Qt.CaseInsensitive
-            filter.property: "title"
-            filter.pattern: new RegExp(searchHeader.query, "i")
-            filterCaseSensitivity: Qt.CaseInsensitive
-        }
+        model: searching ? musicSearch.albums : albumsModelFilter
         delegate: Card {
             id: albumCard
             coverSources: [{art: model.art}]
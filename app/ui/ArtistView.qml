@@ -101,7 +101,15 @@ MusicPage {
                         elide: Text.ElideRight
                         fontSize: "small"
                         maximumLineCount: 1
-                        text: i18n.tr("%1 album", "%1 albums", albumsModel.count).arg(albumsModel.count)
+                        text: i18n.tr("%1 album", "%1 albums", albumCount).arg(albumCount)
+
+                        // Use the library summary when it knows the artist
+                        // so the count does not wait for the albums model
+                        property int albumCount: {
+                            var summary = librarySummary.revision >= 0 ? librarySummary.artist(artistViewPage.artist) : null;
+
+                            return summary !== null ? summary.albums : albumsModel.count;
+                        }
                     }
                 }
                 coverSources: artistViewPage.covers
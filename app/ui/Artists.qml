@@ -28,6 +28,7 @@ import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
 import "../components/HeadState"
+import "../components/Helpers"
 
 
 MusicPage {
@@ -35,7 +36,7 @@ MusicPage {
     objectName: "artistsPage"
     title: i18n.tr("Artists")
     searchable: true
-    searchResultsCount: artistsModelFilter.count
+    searchResultsCount: searching ? (musicSearch.pending ? 1 : musicSearch.artists.count) : artistsModelFilter.count
     state: "default"
     states: [
         SearchableHeadState {
@@ -53,25 +54,38 @@ MusicPage {
     // qml doesn't optimise using the parent type
     property bool bug1341671workaround: true
 
+    // show the results of the full text search once there is a query
+    property bool searching: state === "search" && searchHeader.query !== ""
+
+    Connections {
+        target: searchHeader
+        onQueryChanged: musicSearch.search(searchHeader.query)
+    }
+
+    // full text search of ms2, each page has its own so that the query of
+    // one page doesn't filter the others
+    SearchHelper {
+        id: musicSearch
+    }
+
+    SortFilterModel {
+        id: artistsModelFilter
+        property alias rowCount: artistsModel.rowCount
+        model: ArtistsModel {
+            id: artistsModel
+            albumArtists: true
+            store: musicStore
+        }
+        sort.property: "artist"
+        sort.order: Qt.AscendingOrder
+        sortCaseSensitivity: Qt.CaseInsensitive
+    }
+
     MusicGridView {
         id: artistGridView
         itemWidth: units.gu(12)
         heightOffset: units.gu(7)
-        model: SortFilterModel {
-            id: artistsModelFilter
-            property alias rowCount: artistsModel.rowCount
-            model: ArtistsModel {
-                id: artistsModel
-                albumArtists: true
-                store: musicStore
-            }
-            sort.property: "artist"
-            sort.order: Qt.AscendingOrder
-            sortCaseSensitivity: Qt.CaseInsensitive
-            filter.property: "artist"
-            filter.pattern: new RegExp(searchHeader.query, "i")
-            filterCaseSensitivity: Qt.CaseInsensitive
-        }
+        model: searching ? musicSearch.artists : artistsModelFilter
         delegate: Card {
             id: artistCard
             coverSources: [{art: "image://artistart/artist=" + model.artist + "&album="}]
@@ -19,7 +19,6 @@
 
 import QtQuick 2.4
 import Ubuntu.Components 1.3
-import Ubuntu.MediaScanner 0.1
 import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
@@ -55,10 +54,7 @@ MusicPage {
         heightOffset: units.gu(7)
         model: SortFilterModel {
             id: genresModelFilter
-            model: GenresModel {
-                id: genresModel
-                store: musicStore
-            }
+            model: librarySummary.genres
             filter.property: "genre"
             filter.pattern: searchHeader.query === "" ? /\S+/ : new RegExp(searchHeader.query, "i")
             filterCaseSensitivity: Qt.CaseInsensitive
@@ -69,38 +65,11 @@ MusicPage {
 
         delegate: Card {
             id: genreCard
-            coverSources: []
+            coverSources: JSON.parse(model.covers)
             objectName: "genresPageGridItem" + index
             primaryText: model.genre
             secondaryTextVisible: false
 
-            property string album: ""
-
-            Repeater {
-                id: albumGenreModelRepeater
-                model: AlbumsModel {
-                    genre: model.genre
-                    store: musicStore
-                }
-
-                delegate: Item {
-                    property string art: model.art
-                }
-                property var covers: []
-                signal finished()
-
-                onFinished: {
-                    genreCard.coverSources = covers
-                }
-                onItemAdded: {
-                    covers.push({art: item.art});
-
-                    if (index === count - 1) {
-                        finished();
-                    }
-                }
-            }
-
             onClicked: {
                 mainPageStack.push(Qt.resolvedUrl("SongsView.qml"),
                                    {
@@ -81,7 +81,7 @@ MusicPage {
         objectName: "playlistsGridView"
         delegate: Card {
             id: playlistCard
-            coverSources: Playlists.getPlaylistCovers(model.name)
+            coverSources: JSON.parse(model.covers)
             objectName: "playlistCardItem" + index
             primaryText: model.name
             secondaryText: i18n.tr("%1 track", "%1 tracks", model.count).arg(model.count)
@@ -19,11 +19,9 @@
 
 import QtQuick 2.4
 import Ubuntu.Components 1.3
-import Ubuntu.MediaScanner 0.1
 import Ubuntu.Thumbnailer 0.1
 import QtQuick.LocalStorage 2.0
 import "../logic/meta-database.js" as Library
-import "../logic/playlists.js" as Playlists
 import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
@@ -96,17 +94,10 @@ MusicPage {
         model: recentModel.model
         delegate: Card {
             id: albumCard
-
-            SongsModel {
-                id: recentAlbumSongs
-                album: model.type === "album" ? model.data : undefined
-                store: musicStore
-            }
-
-            coverSources: model.type === "playlist" ? Playlists.getPlaylistCovers(model.data) : (recentAlbumSongs.status === SongsModel.Ready ? [makeDict(recentAlbumSongs.get(0, SongsModel.RoleModelData))] : [])
+            coverSources: JSON.parse(model.covers)
             objectName: "albumsPageGridItem" + index
-            primaryText: model.type === "playlist" ? model.data : (recentAlbumSongs.status === SongsModel.Ready && recentAlbumSongs.get(0, SongsModel.RoleModelData).album != "" ? recentAlbumSongs.get(0, SongsModel.RoleModeData).album : i18n.tr("Unknown Album"))
-            secondaryText: model.type === "playlist" ? i18n.tr("Playlist") : (recentAlbumSongs.status === SongsModel.Ready && recentAlbumSongs.get(0, SongsModel.RoleModelData).author != "" ? recentAlbumSongs.get(0, SongsModel.RoleModelData).author : i18n.tr("Unknown Artist"))
+            primaryText: model.type === "playlist" || model.data !== "" ? model.data : i18n.tr("Unknown Album")
+            secondaryText: model.type === "playlist" ? i18n.tr("Playlist") : (model.author !== "" ? model.author : i18n.tr("Unknown Artist"))
 
             onClicked: {
                 if (model.type === "playlist") {
@@ -116,7 +107,7 @@ MusicPage {
                 mainPageStack.push(Qt.resolvedUrl("SongsView.qml"),
                                    {
                                        "album": model.type !== "playlist" ? model.data : undefined,
-                                       "artist": model.type !== "playlist" ? recentAlbumSongs.get(0, SongsModel.RoleModelData).artist : undefined,
+                                       "artist": model.type !== "playlist" && model.artist !== "" ? model.artist : undefined,
                                        "covers": coverSources,
                                        "isAlbum": (model.type === "album"),
                                        "genre": undefined,
@@ -27,6 +27,7 @@ import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
 import "../components/HeadState"
+import "../components/Helpers"
 import "../components/ListItemActions"
 
 
@@ -35,7 +36,7 @@ MusicPage {
     objectName: "songsPage"
     title: i18n.tr("Tracks")
     searchable: true
-    searchResultsCount: songsModelFilter.count
+    searchResultsCount: searching ? (musicSearch.pending ? 1 : musicSearch.songs.count) : songsModelFilter.count
     state: "default"
     states: [
         SearchableHeadState {
@@ -57,6 +58,32 @@ MusicPage {
     // qml doesn't optimise using the parent type
     property bool bug1341671workaround: true
 
+    // show the results of the full text search once there is a query
+    property bool searching: state === "search" && searchHeader.query !== ""
+
+    Connections {
+        target: searchHeader
+        onQueryChanged: musicSearch.search(searchHeader.query)
+    }
+
+    // full text search of ms2, each page has its own so that the query of
+    // one page doesn't filter the others
+    SearchHelper {
+        id: musicSearch
+    }
+
+    SortFilterModel {
+        id: songsModelFilter
+        property alias rowCount: songsModel.rowCount
+        model: SongsModel {
+            id: songsModel
+            store: musicStore
+        }
+        sort.property: "title"
+        sort.order: Qt.AscendingOrder
+        sortCaseSensitivity: Qt.CaseInsensitive
+    }
+
     MultiSelectListView {
         id: tracklist
         anchors {
@@ -65,20 +92,7 @@ MusicPage {
             topMargin: units.gu(2)
         }
         objectName: "trackstab-listview"
-        model: SortFilterModel {
-            id: songsModelFilter
-            property alias rowCount: songsModel.rowCount
-            model: SongsModel {
-                id: songsModel
-                store: musicStore
-            }
-            sort.property: "title"
-            sort.order: Qt.AscendingOrder
-            sortCaseSensitivity: Qt.CaseInsensitive
-            filter.property: "title"
-            filter.pattern: new RegExp(searchHeader.query, "i")
-            filterCaseSensitivity: Qt.CaseInsensitive
-        }
+        model: searching ? musicSearch.songs : songsModelFilter
 
         onStateChanged: {
             if (state === "multiselectable") {
@@ -107,7 +121,7 @@ MusicPage {
             onItemClicked: {
                 if (songsPage.state === "search") {  // only play single track when searching
                     player.mediaPlayer.playlist.clearWrapper();
-                    player.mediaPlayer.playlist.addItem(Qt.resolvedUrl(songsModelFilter.get(index).filename));
+                    player.mediaPlayer.playlist.addItemsWrapper([Qt.resolvedUrl(model.filename)]);
                     trackQueueClick(0)
                 } else {
                     trackClicked(songsModelFilter, index)  // play track
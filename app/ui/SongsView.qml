@@ -25,6 +25,7 @@ import Ubuntu.Thumbnailer 0.1
 import QtQuick.LocalStorage 2.0
 import "../logic/meta-database.js" as Library
 import "../logic/playlists.js" as Playlists
+import "../logic/storage.js" as Storage
 import "../components"
 import "../components/Delegates"
 import "../components/Flickables"
@@ -84,6 +85,23 @@ MusicPage {
         }
     }
 
+    // Add the album or playlist of this page to recent
+    function addToRecent()
+    {
+        if (isAlbum && songStackPage.line1 !== i18n.tr("Genre")) {
+            var file = albumtrackslist.model.get(0, albumtrackslist.model.RoleModelData)
+
+            Library.addRecent(file.album, "album", recentAlbumMeta(file))
+        } else if (songStackPage.line1 === i18n.tr("Playlist")) {
+            // the covers may be cached in the playlist db as they are read
+            Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                Library.addRecent(songStackPage.line2, "playlist", recentPlaylistMeta(songStackPage.line2))
+            })
+        } else {
+            console.debug("Unknown type to add to recent")
+        }
+    }
+
     function recentChangedHelper()
     {
         // if parent Recent then set changed otherwise refilter
@@ -106,6 +124,7 @@ MusicPage {
         }
 
         if (Library.recentContainsPlaylist(songStackPage.line2) || force) {
+            refreshRecentPlaylist(songStackPage.line2);
             recentChangedHelper();
         }
     }
@@ -124,9 +143,18 @@ MusicPage {
             thisPage: songStackPage
 
             onRemoved: {
-                Playlists.removeFromPlaylist(songStackPage.line2, selectedIndices)
+                var keys = []
 
-                playlistChangedHelper()  // update recent/playlist models
+                // Tracks are removed by their sort key rather than their position
+                for (var i=0; i < selectedIndices.length; i++) {
+                    keys.push(albumTracksModel.model.get(selectedIndices[i]).i)
+                }
+
+                Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                    Playlists.removeFromPlaylist(songStackPage.line2, keys)
+
+                    playlistChangedHelper()  // update recent/playlist models
+                })
 
                 albumTracksModel.filterPlaylistTracks(songStackPage.line2)
             }
@@ -167,13 +195,7 @@ MusicPage {
                     model: albumtrackslist.model
                     width: blurredHeader.width > units.gu(60) ? units.gu(23.5) : (blurredHeader.width - units.gu(13)) / 2
                     onClicked: {
-                        if (isAlbum && songStackPage.line1 !== i18n.tr("Genre")) {
-                            Library.addRecent(albumtrackslist.model.get(0, albumtrackslist.model.RoleModelData).album, "album")
-                        } else if (songStackPage.line1 === i18n.tr("Playlist")) {
-                            Library.addRecent(songStackPage.line2, "playlist")
-                        } else {
-                            console.debug("Unknown type to add to recent")
-                        }
+                        addToRecent()
 
                         recentChangedHelper();
                     }
@@ -186,13 +208,7 @@ MusicPage {
                     model: albumtrackslist.model
                     width: blurredHeader.width > units.gu(60) ? units.gu(23.5) : (blurredHeader.width - units.gu(13)) / 2
                     onClicked: {
-                        if (isAlbum && songStackPage.line1 !== i18n.tr("Genre")) {
-                            Library.addRecent(albumtrackslist.model.get(0, albumtrackslist.model.RoleModelData).album, "album")
-                        } else if (songStackPage.line1 === i18n.tr("Playlist")) {
-                            Library.addRecent(songStackPage.line2, "playlist")
-                        } else {
-                            console.debug("Unknown type to add to recent")
-                        }
+                        addToRecent()
 
                         recentChangedHelper();
                     }
@@ -284,13 +300,7 @@ MusicPage {
             onItemClicked: {
                 trackClicked(albumtrackslist.model, index)  // play track
 
-                if (isAlbum && songStackPage.line1 !== i18n.tr("Genre")) {
-                    Library.addRecent(albumtrackslist.model.get(0, albumtrackslist.model.RoleModelData).album, "album")
-                } else if (songStackPage.line1 === i18n.tr("Playlist")) {
-                    Library.addRecent(songStackPage.line2, "playlist")
-                } else {
-                    console.debug("Unknown type to add to recent")
-                }
+                addToRecent()
 
                 recentChangedHelper();
             }
@@ -301,9 +311,11 @@ MusicPage {
                     actions: [
                         Remove {
                             onTriggered: {
-                                Playlists.removeFromPlaylist(songStackPage.line2, [model.i])
+                                Storage.unitOfWork([Storage.playlist, Storage.metadata], function() {
+                                    Playlists.removeFromPlaylist(songStackPage.line2, [model.i])
 
-                                playlistChangedHelper()  // update recent/playlist models
+                                    playlistChangedHelper()  // update recent/playlist models
+                                })
 
                                 albumTracksModel.filterPlaylistTracks(songStackPage.line2)
                             }
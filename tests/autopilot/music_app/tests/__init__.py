@@ -16,8 +16,12 @@
 
 """Music app autopilot tests."""
 
+import bisect
+import hashlib
 import os
 import os.path
+import random
+import re
 import shutil
 import sqlite3
 import logging
@@ -35,6 +39,211 @@ from ubuntuuitoolkit import base
 logger = logging.getLogger(__name__)
 
 
+def create_large_mediastore(db_path, schema_path, music_dir, tracks=30000,
+                            albums=3000, artists=600, genres=40,
+                            missing_album_ratio=0.05, unicode_ratio=0.1,
+                            long_title_ratio=0.02, seed=0, source=None):
+    """Create a mediascanner database with a generated library of tracks
+
+    The database follows the mediastore schema, so media_fts and the
+    indexes are filled by the schema's triggers. Album sizes are skewed
+    so a few albums are large while most have a handful of tracks, and a
+    ratio of the tracks have no album, unicode or very long titles.
+
+    :param db_path: path of the mediastore database to create
+    :param schema_path: path of the mediastore schema
+    :param music_dir: directory the generated filenames are placed in
+    :param source: if set the generated filenames are linked to this file
+    :returns: the generated filenames
+    """
+    rand = random.Random(seed)
+    unicode_words = [u"Tárrega", u"Ñandú", u"Straße", u"Ærøskøbing",
+                     u"Дорога", u"夜の歌", u"사랑", u"Όνειρο", u"♫"]
+    words = [u"Love", u"Night", u"Blue", u"Road", u"Fire", u"River",
+             u"Dream", u"Song", u"Light", u"Heart", u"Summer", u"Stone"]
+
+    def name(prefix, i):
+        word = rand.choice(unicode_words if rand.random() < unicode_ratio
+                           else words)
+        return u"%s %s %d" % (prefix, word, i)
+
+    artist_names = [name(u"Artist", i) for i in range(artists)]
+    genre_names = [name(u"Genre", i) for i in range(genres)]
+    album_info = [(name(u"Album", i), rand.choice(artist_names),
+                   rand.choice(genre_names), str(rand.randint(1950, 2016)))
+                  for i in range(albums)]
+    album_weights = []
+    total = 0.0
+
+    for i in range(albums):
+        total += rand.paretovariate(1.5)
+        album_weights.append(total)
+
+    track_numbers = {}
+
+    if source is not None and not os.path.exists(music_dir):
+        os.makedirs(music_dir)
+
+    con = sqlite3.connect(db_path)
+
+    # the schema is a dump so skip the shadow tables, the fts4 module
+    # creates them with media_fts
+    with open(schema_path, 'rb') as f:
+        con.executescript(u"".join(
+            line for line in f.read().decode("utf-8").splitlines(True)
+            if not line.startswith(u"CREATE TABLE 'media_fts_")))
+
+    con.execute("INSERT INTO schemaVersion VALUES(10)")
+
+    rows = []
+
+    for i in range(tracks):
+        filename = os.path.join(music_dir, "%06d.ogg" % i)
+
+        if rand.random() < missing_album_ratio:
+            album, artist = u"", rand.choice(artist_names)
+            genre, date = rand.choice(genre_names), u""
+            track_number = 0
+        else:
+            index = bisect.bisect(album_weights, rand.random() * total)
+            album, artist, genre, date = album_info[index]
+            track_numbers[index] = track_numbers.get(index, 0) + 1
+            track_number = track_numbers[index]
+
+        title = name(u"Track", i)
+
+        if rand.random() < long_title_ratio:
+            title = u" ".join([title] * 20)
+
+        rows.append((filename, "audio/ogg", "%d:0" % i, title, date, artist,
+                     album, artist, genre, 0, track_number,
+                     rand.randint(30, 600), 0, 0, 0.0, 0.0, 0, 1409807154, 1))
+
+        if source is not None:
+            os.symlink(source, filename)
+
+    con.executemany(
+        "INSERT INTO media (filename, content_type, etag, title, date, "
+        "artist, album, album_artist, genre, disc_number, track_number, "
+        "duration, width, height, latitude, longitude, has_thumbnail, "
+        "mtime, type) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
+        "?, ?, ?, ?)", rows)
+    con.commit()
+    con.close()
+
+    return [row[0] for row in rows]
+
+
+SCHEMA_LOCATIONS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 "../../../../app/logic/schema.js"),
+    "/usr/share/music-app/app/logic/schema.js",
+]
+
+
+def schema_versions():
+    """Read the versions of the parts of the schema from schema.js
+
+    :returns: dict of part names to versions
+    """
+    for path in SCHEMA_LOCATIONS:
+        if os.path.exists(path):
+            with open(path) as f:
+                versions = re.findall(
+                    r'\{name: "(\w+)", version: (\d+)', f.read())
+
+            return dict((name, int(version)) for name, version in versions)
+
+    raise IOError("app/logic/schema.js was not found")
+
+
+def _open_local_storage(data_dir, name, version):
+    """Open a QtQuick.LocalStorage database of the app by name"""
+    db_dir = os.path.join(data_dir, 'Databases')
+    db_file = hashlib.md5(name.encode("utf-8")).hexdigest()
+
+    if not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+
+    with open(os.path.join(db_dir, db_file + ".ini"), 'w') as f:
+        f.write("[General]\nDescription=StorageDatabase\nDriver=QSQLITE\n"
+                "EstimatedSize=1000000\nName=%s\nVersion=%s\n" %
+                (name, version))
+
+    con = sqlite3.connect(os.path.join(db_dir, db_file + ".sqlite"))
+
+    # As the app does on first open, before any table is created
+    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    return con
+
+
+def create_app_databases(data_dir, queue=(), playlists=None):
+    """Create the app databases with a saved queue and playlists
+
+    Every part of the schema is created at its current version, read
+    from app/logic/schema.js, and recorded in schema_version so that no
+    upgrades run when the app starts.
+
+    :param data_dir: the data directory of the app
+    :param queue: list of filenames in the saved queue
+    :param playlists: dict of playlist names to lists of (filename, duration)
+    """
+    versions = schema_versions()
+    rand = random.Random(0)
+
+    con = _open_local_storage(data_dir, "music-app-metadata", "1.0")
+    con.executescript(
+        "CREATE TABLE queue(ind INTEGER PRIMARY KEY, filename TEXT, "
+        "shuffle REAL);"
+        "CREATE TABLE recent(time DATETIME UNIQUE, data TEXT, type TEXT, "
+        "author TEXT NOT NULL DEFAULT '', artist TEXT NOT NULL DEFAULT '', "
+        "covers TEXT NOT NULL DEFAULT '[]');"
+        "CREATE INDEX recent_type_data ON recent(type, data);"
+        "CREATE TABLE maintenance(name TEXT PRIMARY KEY, "
+        "time INTEGER NOT NULL);"
+        "CREATE TABLE schema_version(name TEXT PRIMARY KEY, "
+        "version INTEGER NOT NULL);")
+    con.executemany(
+        "INSERT INTO queue (ind, filename, shuffle) VALUES (?, ?, ?)",
+        [(ind, filename, rand.random())
+         for ind, filename in enumerate(queue)])
+    con.executemany(
+        "INSERT INTO schema_version (name, version) VALUES (?, ?)",
+        versions.items())
+    con.commit()
+    con.close()
+
+    con = _open_local_storage(data_dir, "music-app-playlist",
+                              "1.%d" % versions["playlist"])
+    con.executescript(
+        "CREATE TABLE playlist(name TEXT PRIMARY KEY, "
+        "FOREIGN KEY (name) REFERENCES track(playlist));"
+        "CREATE TABLE track(i INTEGER NOT NULL, playlist TEXT NOT NULL, "
+        "filename TEXT, title TEXT, author TEXT, album TEXT, "
+        "duration INTEGER, PRIMARY KEY (playlist, i), "
+        "FOREIGN KEY (playlist) REFERENCES tracks(playlist));"
+        "CREATE TABLE playlist_summary(name TEXT PRIMARY KEY, "
+        "count INTEGER NOT NULL DEFAULT 0, "
+        "duration INTEGER NOT NULL DEFAULT 0, covers TEXT);"
+        "CREATE INDEX track_filename_idx ON track(filename);")
+
+    for name, tracks in (playlists or {}).items():
+        con.execute("INSERT INTO playlist (name) VALUES (?)", (name,))
+        con.executemany(
+            "INSERT INTO track (i, playlist, filename, duration) "
+            "VALUES (?, ?, ?, ?)",
+            [((i + 1) * 1048576, name, filename, duration)
+             for i, (filename, duration) in enumerate(tracks)])
+        con.execute(
+            "INSERT INTO playlist_summary (name, count, duration) "
+            "VALUES (?, ?, ?)",
+            (name, len(tracks), sum(duration for _, duration in tracks)))
+
+    con.commit()
+    con.close()
+
+
 class BaseTestClassWithPatchedHome(AutopilotTestCase):
     """A common test case class that provides several useful methods for
     music-app tests."""
@@ -211,6 +420,41 @@ class BaseTestClassWithPatchedHome(AutopilotTestCase):
             "Mediascanner database copied, files " +
             str(os.listdir(mediascannerpath)))
 
+    def _create_large_music_library(self, **kwargs):
+        logger.debug("Creating large music library for %s test" %
+                     self.test_type)
+        musicpath = os.path.join(self.home_dir, 'Music', 'library')
+        mediascannerpath = os.path.join(self.home_dir,
+                                        '.cache/mediascanner-2.0')
+        content_dir = os.path.join(os.path.dirname(music_app.__file__),
+                                   'content', 'mediascanner-2.0')
+
+        if not os.path.exists(mediascannerpath):
+            os.makedirs(mediascannerpath)
+
+        files = create_large_mediastore(
+            os.path.join(mediascannerpath, "mediastore.db"),
+            os.path.join(content_dir, "mediastore.sch"),
+            musicpath,
+            source=os.path.join(content_dir, 'songs', '1.ogg'),
+            **kwargs)
+
+        logger.debug("Large mediascanner database created in %s" %
+                     mediascannerpath)
+
+        return files
+
+    def _create_app_databases(self, queue=(), playlists=None):
+        data_dir = os.path.join(self.home_dir,
+                                '.local/share/com.ubuntu.music')
+        local_dir = os.path.join(data_dir, 'Databases')
+
+        # start from a clean state each time
+        if os.path.exists(local_dir):
+            shutil.rmtree(local_dir)
+
+        create_app_databases(data_dir, queue, playlists)
+
     def _file_find_replace(self, in_filename, find, replace):
         # replace all occurences of string find with string replace
         # in the given file
@@ -249,6 +493,39 @@ class EmptyLibraryWithPatchedHome(BaseTestClassWithPatchedHome):
         self._create_music_library('blank-mediascanner-2.0')
 
 
+class LargeLibraryWithPatchedHome(BaseTestClassWithPatchedHome):
+
+    """ Base test case class for music-app with a generated large library.
+
+    Subclasses can override the library attributes to change the size and
+    tags of the generated library."""
+
+    library_tracks = 30000
+    library_albums = 3000
+    library_artists = 600
+    library_genres = 40
+    library_missing_album_ratio = 0.05
+    library_unicode_ratio = 0.1
+    library_long_title_ratio = 0.02
+
+    def setUp(self):
+        super(BaseTestClassWithPatchedHome, self).setUp()
+        self.launcher, self.test_type = self.get_launcher_method_and_type()
+
+        if self.test_type == 'click':
+            self.skipTest("A generated library cannot be used on a device")
+
+        self.home_dir = self._patch_home()
+        self.library_files = self._create_large_music_library(
+            tracks=self.library_tracks,
+            albums=self.library_albums,
+            artists=self.library_artists,
+            genres=self.library_genres,
+            missing_album_ratio=self.library_missing_album_ratio,
+            unicode_ratio=self.library_unicode_ratio,
+            long_title_ratio=self.library_long_title_ratio)
+
+
 class MusicAppTestCase(BaseTestCaseWithPatchedHome):
 
     """Base test case that launches the music-app."""
@@ -266,3 +543,13 @@ class MusicAppTestCaseEmptyLibrary(EmptyLibraryWithPatchedHome):
     def setUp(self):
         super(MusicAppTestCaseEmptyLibrary, self).setUp()
         self.app = MusicApp(self.launcher())
+
+
+class MusicAppTestCaseLargeLibrary(LargeLibraryWithPatchedHome):
+
+    """Test case that launches the music-app with a generated library of
+    library_tracks tracks."""
+
+    def setUp(self):
+        super(MusicAppTestCaseLargeLibrary, self).setUp()
+        self.app = MusicApp(self.launcher())
@@ -14,7 +14,11 @@ from autopilot.matchers import Eventually
 from testtools.matchers import Equals, GreaterThan, LessThan, NotEquals
 
 
-from music_app.tests import MusicAppTestCase, MusicAppTestCaseEmptyLibrary
+from music_app.tests import (
+    MusicAppTestCase,
+    MusicAppTestCaseEmptyLibrary,
+    MusicAppTestCaseLargeLibrary
+)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +39,24 @@ class TestEmptyLibrary(MusicAppTestCaseEmptyLibrary):
         self.assertThat(library.visible, Eventually(Equals(True)))
 
 
+class TestLargeLibrary(MusicAppTestCaseLargeLibrary):
+
+    def setUp(self):
+        super(TestLargeLibrary, self).setUp()
+        self.app.get_walkthrough_page().skip()
+
+    def test_reads_large_music_library(self):
+        """ tests if a generated large library is loaded and can be
+        played from the songs tab"""
+
+        self.assertThat(self.app.loaded, Eventually(Equals(True)))
+
+        self.app.populate_queue()  # populate queue
+
+        self.assertThat(self.app.get_queue_count(),
+                        Eventually(Equals(self.library_tracks)))
+
+
 class TestMainWindow(MusicAppTestCase):
 
     def setUp(self):
@@ -290,6 +312,45 @@ class TestMainWindow(MusicAppTestCase):
 
             count += 1
 
+    def test_shuffle_order(self):
+        """ Test shuffle visits each track once before repeating """
+
+        self.app.populate_queue()  # populate queue
+
+        now_playing_page = self.app.get_now_playing_page()
+
+        now_playing_page.set_repeat(True)
+        now_playing_page.set_shuffle(True)
+
+        # pause the track if it is playing
+        if self.player.isPlaying:
+            now_playing_page.click_play_button()
+
+        self.player.isPlaying.wait_for(False)
+
+        indexes = [self.player.currentIndex]
+
+        for i in range(self.player.count):
+            previous_index = self.player.currentIndex
+
+            # select next track
+            now_playing_page.click_forward_button()
+
+            self.assertThat(self.player.currentIndex,
+                            Eventually(NotEquals(previous_index)))
+
+            # pause the track if it is playing
+            if self.player.isPlaying:
+                now_playing_page.click_play_button()
+
+            self.player.isPlaying.wait_for(False)
+
+            indexes.append(self.player.currentIndex)
+
+        # every track once and then the order starts again
+        self.assertThat(len(set(indexes[:-1])), Equals(self.player.count))
+        self.assertThat(indexes[-1], Equals(indexes[0]))
+
     def test_show_albums_page(self):
         """tests navigating to the Albums tab and displaying the album page"""
 
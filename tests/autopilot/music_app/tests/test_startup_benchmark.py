@@ -0,0 +1,201 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+# Copyright 2016 Canonical
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+
+"""Music app cold start benchmarks.
+
+These are skipped unless MUSIC_APP_BENCHMARK is set, as each scenario
+launches the app several times against a generated library. The
+following environment variables configure the run:
+
+MUSIC_APP_BENCHMARK_REPEATS: launches per scenario (default 5)
+MUSIC_APP_BENCHMARK_RESULTS: file the results are written to
+MUSIC_APP_BENCHMARK_BASELINES: file of baselines to compare against
+MUSIC_APP_BENCHMARK_THRESHOLD: allowed regression ratio (default 0.2)
+
+The results file has the same format as the baselines file, so a run
+can be copied as the new baselines.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import math
+import os
+import time
+
+from testtools import skipUnless
+
+from music_app import MusicApp
+from music_app.tests import LargeLibraryWithPatchedHome
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("first_frame", "loaded", "queue_restored")
+PERCENTILES = (50, 90, 95)
+
+
+def percentile(values, p):
+    """Nearest rank percentile of the values"""
+    values = sorted(values)
+    rank = int(math.ceil(p / 100.0 * len(values)))
+
+    return values[max(rank, 1) - 1]
+
+
+def summarise(samples):
+    """Summarise the samples of each metric into percentiles"""
+    return dict(
+        (metric, dict(("p%d" % p, percentile(values, p))
+                      for p in PERCENTILES))
+        for metric, values in samples.items())
+
+
+def load_json(path):
+    if path is None or not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+@skipUnless(os.environ.get("MUSIC_APP_BENCHMARK"),
+            "set MUSIC_APP_BENCHMARK to run the startup benchmarks")
+class TestStartupBenchmark(LargeLibraryWithPatchedHome):
+
+    scenarios = [
+        (name, dict(params, scenario_name=name)) for name, params in [
+            ("small", {"library_tracks": 1000, "library_albums": 100,
+                       "library_artists": 40, "queue_size": 0,
+                       "playlist_count": 0, "playlist_size": 0}),
+            ("small_queue", {"library_tracks": 1000, "library_albums": 100,
+                             "library_artists": 40, "queue_size": 1000,
+                             "playlist_count": 10, "playlist_size": 100}),
+            ("medium", {"library_tracks": 10000, "library_albums": 1000,
+                        "library_artists": 200, "queue_size": 1000,
+                        "playlist_count": 20, "playlist_size": 200}),
+            ("large", {"library_tracks": 30000, "queue_size": 0,
+                       "playlist_count": 0, "playlist_size": 0}),
+            ("large_queue", {"library_tracks": 30000, "queue_size": 5000,
+                             "playlist_count": 50, "playlist_size": 500}),
+        ]
+    ]
+
+    timeout = 120  # seconds to wait for a launch to reach each milestone
+
+    def setUp(self):
+        super(TestStartupBenchmark, self).setUp()
+
+        self.repeats = int(os.environ.get("MUSIC_APP_BENCHMARK_REPEATS", 5))
+        self.results_path = os.environ.get(
+            "MUSIC_APP_BENCHMARK_RESULTS",
+            os.path.join(os.getcwd(), "music-app-startup-benchmark.json"))
+        self.baselines_path = os.environ.get(
+            "MUSIC_APP_BENCHMARK_BASELINES")
+        self.threshold = float(
+            os.environ.get("MUSIC_APP_BENCHMARK_THRESHOLD", 0.2))
+
+        files = self.library_files
+        self.queue = files[:self.queue_size]
+        self.playlists = dict(
+            ("Playlist %d" % i,
+             [(files[(i * self.playlist_size + j) % len(files)], 0)
+              for j in range(self.playlist_size)])
+            for i in range(self.playlist_count))
+
+    def _wait_for(self, condition):
+        """Poll condition until it is true, returning the time it was"""
+        end = time.time() + self.timeout
+
+        while not condition():
+            if time.time() > end:
+                self.fail("Timed out waiting for the app to start")
+
+            time.sleep(0.05)
+
+        return time.time()
+
+    def _launch(self):
+        """Launch the app once, returning the time to each milestone"""
+        self._create_app_databases(self.queue, self.playlists)
+
+        start = time.time()
+        app = MusicApp(self.launcher())
+
+        first_frame = self._wait_for(lambda: app.main_view.visible)
+        loaded = self._wait_for(lambda: app.loaded)
+        queue_restored = self._wait_for(
+            lambda: app.get_queue_count() == len(self.queue))
+
+        # close the app so the next launch is a cold start
+        app.app.process.kill()
+        app.app.process.wait()
+
+        return {
+            "first_frame": first_frame - start,
+            "loaded": loaded - start,
+            "queue_restored": queue_restored - start,
+        }
+
+    def _write_results(self, summary):
+        results = load_json(self.results_path)
+        results.setdefault("scenarios", {})[self.scenario_name] = summary
+
+        with open(self.results_path, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+        logger.info("Startup benchmark %s: %s" %
+                    (self.scenario_name, json.dumps(summary)))
+
+    def _compare_baseline(self, summary):
+        """Fail if a median is worse than its baseline by the threshold"""
+        baselines = load_json(self.baselines_path)
+        thresholds = baselines.get("thresholds", {})
+        baseline = baselines.get("scenarios", {}).get(self.scenario_name)
+
+        if baseline is None:
+            logger.info("No baseline for %s" % self.scenario_name)
+            return
+
+        regressions = []
+
+        for metric in METRICS:
+            if metric not in baseline:
+                continue
+
+            limit = baseline[metric]["p50"] * (
+                1 + thresholds.get(metric, self.threshold))
+
+            if summary[metric]["p50"] > limit:
+                regressions.append(
+                    "%s p50 %.3fs is over %.3fs" %
+                    (metric, summary[metric]["p50"], limit))
+
+        if regressions:
+            self.fail("Startup regressed for %s: %s" %
+                      (self.scenario_name, ", ".join(regressions)))
+
+    def test_cold_start(self):
+        """ measure the time for the app to start and restore its queue"""
+
+        samples = dict((metric, []) for metric in METRICS)
+
+        for i in range(self.repeats):
+            times = self._launch()
+
+            for metric in METRICS:
+                samples[metric].append(times[metric])
+
+        summary = summarise(samples)
+        summary["library_tracks"] = self.library_tracks
+        summary["queue_size"] = self.queue_size
+        summary["playlist_count"] = self.playlist_count
+        summary["playlist_size"] = self.playlist_size
+        summary["repeats"] = self.repeats
+
+        self._write_results(summary)
+        self._compare_baseline(summary)